@@ -6,6 +6,8 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from config import config
 from flask_pagedown import PageDown
+from .compression import Compress
+from .serialization import FastJSONProvider
 
 bootstrap = Bootstrap()
 mail = Mail()
@@ -13,6 +15,7 @@ moment = Moment()
 db = SQLAlchemy()
 
 page_down = PageDown()
+compress = Compress()
 
 login_manager = LoginManager()
 login_manager.login_view = "auth.login"
@@ -20,6 +23,7 @@ login_manager.login_view = "auth.login"
 
 def create_app(config_name):
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     app.config.from_object(config[config_name])
     config[config_name].init_app(app)
     bootstrap.init_app(app)
@@ -28,6 +32,7 @@ def create_app(config_name):
     db.init_app(app)
     login_manager.init_app(app)
     page_down.init_app(app)
+    compress.init_app(app)
 
     if app.config['SSL_REDIRECT']:
         from flask_sslify import SSLify
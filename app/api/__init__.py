@@ -2,4 +2,5 @@ from flask import Blueprint
 
 api = Blueprint("api", __name__)
 
-from . import authentication, posts, users, comments, errors   # nopep8
+from . import ratelimit, authentication, posts, users, comments, changes, \
+    stats, export, errors  # nopep8
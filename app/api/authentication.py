@@ -1,9 +1,36 @@
-from flask import g, jsonify
+import hashlib
+import hmac
+from flask import current_app, g, jsonify
 from flask_httpauth import HTTPBasicAuth
 from . import api
+from ..cache import LRUCache
 from ..models import User
 from .errors import unauthorized, forbidden
+from .ratelimit import rate_limit
+from .tokens import verify_token
 auth = HTTPBasicAuth()
+credentials_cache = LRUCache('credentials')
+
+
+def check_password(user, password):
+    """Verify ``password`` for ``user``, skipping the hash when possible.
+
+    Successful checks are remembered for ``FLASKY_CREDENTIALS_CACHE_TTL``
+    under an HMAC of the user id, the stored hash and the password, so a
+    password change leaves the old entries unreachable.
+    """
+    key = hmac.new(current_app.config['SECRET_KEY'].encode('utf-8'),
+                   f'{user.id}:{user.password_hash}:{password}'
+                   .encode('utf-8'), hashlib.sha256).hexdigest()
+    if credentials_cache.get(key):
+        return True
+    if not user.verify_password(password):
+        return False
+    credentials_cache.maxsize = \
+        current_app.config['FLASKY_CREDENTIALS_CACHE_SIZE']
+    credentials_cache.set(
+        key, True, ttl=current_app.config['FLASKY_CREDENTIALS_CACHE_TTL'])
+    return True
 
 
 @auth.verify_password
@@ -11,7 +38,7 @@ def verify_password(email_or_token, password):
     if email_or_token == '':
         return False
     if password == '':
-        g.current_user = User.verify_auth_token(email_or_token)
+        g.current_user = verify_token(email_or_token)
         g.token_used = True
         return g.current_user is not None
     user = User.query.filter_by(email=email_or_token.lower()).first()
@@ -19,12 +46,12 @@ def verify_password(email_or_token, password):
         return False
     g.current_user = user
     g.token_used = False
-    return user.verify_password(password)
+    return check_password(user, password)
 
 
 @auth.error_handler
 def auth_error():
-    return unauthorized('Invalid credentials')
+    return rate_limit() or unauthorized('Invalid credentials')
 
 
 @api.before_request
@@ -32,7 +59,21 @@ def auth_error():
 def before_request():
     if not g.current_user.is_anonymous and \
             not g.current_user.confirmed:
-        return forbidden('Unconfirmed account')
+        return rate_limit() or forbidden('Unconfirmed account')
+    return rate_limit(g.current_user)
+
+
+@api.after_request
+def issue_token(response):
+    expiration = current_app.config['FLASKY_API_ISSUED_TOKEN_EXPIRATION']
+    if expiration and response.status_code < 400 and \
+            g.get('token_used') is False and \
+            not g.current_user.is_anonymous:
+        response.headers['Authentication-Info'] = \
+            'token="{}", expiration={}'.format(
+                g.current_user.generate_auth_token(expiration=expiration),
+                expiration)
+    return response
 
 
 @api.route('/tokens/', methods=['POST'])
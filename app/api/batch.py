@@ -0,0 +1,91 @@
+from flask import current_app, jsonify, request, url_for
+from .. import db
+from ..exceptions import ValidationError
+from ..rendering import render_many
+from .conditional import conditional, make_etag
+from .fields import etag_parts, to_json, with_expansions
+
+
+def batch_items(name):
+    items = request.json
+    if isinstance(items, dict):
+        items = items.get(name)
+    if not isinstance(items, list) or not items:
+        raise ValidationError(f'expected a list of {name}')
+    limit = current_app.config['FLASKY_API_BATCH_SIZE']
+    if len(items) > limit:
+        raise ValidationError(f'at most {limit} {name} per request')
+    return items
+
+
+def requested_ids():
+    try:
+        ids = [int(id) for id in request.args.get('ids', '').split(',')
+               if id.strip()]
+    except ValueError:
+        raise ValidationError('ids must be a comma separated list of '
+                              'integers')
+    if not ids:
+        raise ValidationError('no ids given')
+    limit = current_app.config['FLASKY_API_BATCH_SIZE']
+    if len(ids) > limit:
+        raise ValidationError(f'at most {limit} ids per request')
+    return ids
+
+
+def get_many(model, name):
+    """Return the rows of ``model`` listed in ``?ids=`` with one query.
+
+    Items come back in the requested order; ids that do not exist are
+    listed under ``missing``.
+    """
+    ids = requested_ids()
+    found = {item.id: item for item in
+             with_expansions(model.query, model)
+             .filter(model.id.in_(set(ids))).all()}
+    items = [found[id] for id in ids if id in found]
+    missing = [id for id in ids if id not in found]
+    etag = make_etag(request.full_path, [etag_parts(item) for item in items])
+    return conditional(etag, lambda: jsonify({
+        name: [to_json(item) for item in items],
+        'missing': missing
+    }))
+
+
+def create_many(model, items, prepare, name, endpoint):
+    """Create one ``model`` row per JSON item in a single transaction.
+
+    Items that fail validation are reported individually and do not
+    stop the others. Bodies are rendered in one batch up front. The
+    response is 201 when every item was created, 207 when only some
+    were and 400 when none were.
+    """
+    bodies = [item.get('body') for item in items if isinstance(item, dict)]
+    render_many([body for body in bodies if body and isinstance(body, str)],
+                model.allowed_tags)
+    results = []
+    for item in items:
+        try:
+            if not isinstance(item, dict):
+                raise ValidationError(f'{name} item is not an object')
+            instance = model.from_json(item)
+        except ValidationError as e:
+            results.append({'status': 400, 'error': 'bad request',
+                            'message': e.args[0]})
+            continue
+        prepare(instance)
+        db.session.add(instance)
+        results.append(instance)
+    db.session.flush()
+    results = [result if isinstance(result, dict) else {
+        'status': 201, 'location': url_for(endpoint, id=result.id),
+        name: result.to_json()} for result in results]
+    db.session.commit()
+    created = sum(result['status'] == 201 for result in results)
+    if created == len(results):
+        status = 201
+    elif created:
+        status = 207
+    else:
+        status = 400
+    return jsonify({'results': results, 'created': created}), status
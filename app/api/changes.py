@@ -0,0 +1,56 @@
+from flask import current_app, jsonify, request, url_for
+from ..exceptions import ValidationError
+from ..models import Change, Comment, Post
+from . import api
+from .fields import to_json, with_expansions
+
+models = {'post': Post, 'comment': Comment}
+
+
+@api.route('/posts/changes')
+def get_changes():
+    """Return the post and comment changes recorded after ``?since=``.
+
+    ``since`` is the ``sequence`` of the last change a client has seen,
+    0 to start from the beginning. Each batch holds at most
+    ``FLASKY_CHANGES_PER_PAGE`` changes with the current state of the
+    items they touched, ``null`` for deleted ones, so syncing costs one
+    indexed range query plus one query per resource type. Superseded
+    changes may have been compacted away, so clients should treat every
+    change as an upsert (or a removal) of the item's current state.
+    """
+    try:
+        since = int(request.args.get('since', 0))
+    except ValueError:
+        raise ValidationError('invalid cursor')
+    per_page = current_app.config['FLASKY_CHANGES_PER_PAGE']
+    limit = max(1, min(request.args.get('limit', per_page, type=int),
+                       per_page))
+    changes = Change.query.filter(Change.sequence > since)\
+        .order_by(Change.sequence).limit(limit + 1).all()
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    items = {}
+    for resource, model in models.items():
+        ids = {change.resource_id for change in changes
+               if change.resource == resource}
+        if ids:
+            items.update(((resource, item.id), item) for item in
+                         with_expansions(model.query, model)
+                         .filter(model.id.in_(ids)))
+    json_changes = []
+    for change in changes:
+        item = items.get((change.resource, change.resource_id))
+        json_change = change.to_json(to_json(item) if item else None)
+        if isinstance(item, Comment):
+            json_change['disabled'] = bool(item.disabled)
+        json_changes.append(json_change)
+    if changes:
+        since = changes[-1].sequence
+    return jsonify({
+        'changes': json_changes,
+        'since': since,
+        'next': url_for('api.get_changes',
+                        **dict(request.args.items(), since=since)),
+        'has_more': has_more
+    })
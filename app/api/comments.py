@@ -2,56 +2,43 @@ from flask import jsonify, request, g, url_for, current_app
 from .. import db
 from ..models import Post, Permission, Comment
 from . import api
+from .batch import batch_items, create_many, get_many
 from .decorators import permission_required
+from .pagination import paginated
+from ..counts import table_estimate
+from .conditional import conditional
+from .fields import resource_etag, to_json, with_expansions
+from .response_cache import cached_response
 
 
 @api.route('/comments/')
 def get_comments():
-    page = request.args.get('page', 1, type=int)
-    pagination = Comment.query.order_by(Comment.timestamp.desc()).paginate(
-        page, per_page=current_app.config['FLASKY_COMMENTS_PER_PAGE'],
-        error_out=False)
-    comments = pagination.items
-    prev = None
-    if pagination.has_prev:
-        prev = url_for('api.get_comments', page=page-1)
-    next = None
-    if pagination.has_next:
-        next = url_for('api.get_comments', page=page+1)
-    return jsonify({
-        'comments': [comment.to_json() for comment in comments],
-        'prev': prev,
-        'next': next,
-        'count': pagination.total
-    })
+    if 'ids' in request.args:
+        return get_many(Comment, 'comments')
+    return paginated(
+        Comment.query, 'comments', 'api.get_comments',
+        key=(Comment.timestamp, Comment.id),
+        per_page=current_app.config['FLASKY_COMMENTS_PER_PAGE'],
+        estimate=table_estimate('comments'))
 
 
 @api.route('/comments/<int:id>')
+@cached_response('comments:{id}')
 def get_comment(id):
-    comment = Comment.query.get_or_404(id)
-    return jsonify(comment.to_json())
+    comment = with_expansions(Comment.query, Comment).get_or_404(id)
+    return conditional(resource_etag(comment),
+                       lambda: jsonify(to_json(comment)),
+                       last_modified=comment.timestamp)
 
 
 @api.route('/posts/<int:id>/comments/')
 def get_post_comments(id):
     post = Post.query.get_or_404(id)
-    page = request.args.get('page', 1, type=int)
-    pagination = post.comments.order_by(Comment.timestamp.asc()).paginate(
-        page, per_page=current_app.config['FLASKY_COMMENTS_PER_PAGE'],
-        error_out=False)
-    comments = pagination.items
-    prev = None
-    if pagination.has_prev:
-        prev = url_for('api.get_post_comments', id=id, page=page-1)
-    next = None
-    if pagination.has_next:
-        next = url_for('api.get_post_comments', id=id, page=page+1)
-    return jsonify({
-        'comments': [comment.to_json() for comment in comments],
-        'prev': prev,
-        'next': next,
-        'count': pagination.total
-    })
+    return paginated(
+        post.comments, 'comments', 'api.get_post_comments',
+        key=(Comment.timestamp, Comment.id),
+        per_page=current_app.config['FLASKY_COMMENTS_PER_PAGE'],
+        ascending=True, estimate=lambda: post.comment_count, id=id)
 
 
 @api.route('/posts/<int:id>/comments/', methods=['POST'])
@@ -65,3 +52,15 @@ def new_post_comment(id):
     db.session.commit()
     return jsonify(comment.to_json()), 201, \
         {'Location': url_for('api.get_comment', id=comment.id)}
+
+
+@api.route('/posts/<int:id>/comments/batch', methods=['POST'])
+@permission_required(Permission.COMMENT)
+def new_post_comments(id):
+    post = Post.query.get_or_404(id)
+
+    def prepare(comment):
+        comment.author = g.current_user
+        comment.post = post
+    return create_many(Comment, batch_items('comments'), prepare, 'comment',
+                       'api.get_comment')
@@ -0,0 +1,41 @@
+import datetime
+import hashlib
+from flask import current_app, request
+from ..compression import etag_variants
+
+
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def is_fresh(etag, last_modified=None):
+    if request.if_none_match:
+        return any(request.if_none_match.contains_weak(tag)
+                   for tag in etag_variants(etag))
+    if last_modified is not None and request.if_modified_since is not None:
+        last_modified = last_modified.replace(
+            microsecond=0, tzinfo=datetime.timezone.utc)
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def matches(etag):
+    """Whether ``If-Match`` names any representation of ``etag``."""
+    return any(request.if_match.contains(tag) for tag in etag_variants(etag))
+
+
+def conditional(etag, build, last_modified=None):
+    """Answer a GET with 304 when the client's validators still match.
+
+    ``build`` is only called to produce the full response when the
+    client's copy is stale, so serialization is skipped otherwise.
+    """
+    if is_fresh(etag, last_modified):
+        response = current_app.response_class(status=304)
+    else:
+        response = build()
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified.replace(
+            tzinfo=datetime.timezone.utc)
+    return response
@@ -8,7 +8,7 @@ def permission_required(permission):
         @wraps(f)
         def decorated_function(*args, **kwargs):
             if not g.current_user.can(permission):
-                return forbidden('Insufficient permissions'),
+                return forbidden('Insufficient permissions')
             return f(*args, **kwargs)
         return decorated_function
     return decorator
@@ -21,6 +21,19 @@ def forbidden(message):
     return response
 
 
+def precondition_failed(message):
+    response = jsonify({'error': 'precondition failed', 'message': message})
+    response.status_code = 412
+    return response
+
+
+def too_many_requests(message, retry_after):
+    response = jsonify({'error': 'too many requests', 'message': message})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
 @api.errorhandler(ValidationError)
 def validation_error(e):
     return bad_request(e.args[0])
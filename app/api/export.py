@@ -0,0 +1,23 @@
+from flask import abort, current_app, request, stream_with_context
+from ..export import export_lines, gzipped, tables
+from ..models import Permission
+from . import api
+from .decorators import permission_required
+from .fields import to_json, with_expansions
+
+
+@api.route('/export/<table>')
+@permission_required(Permission.ADMIN)
+def export(table):
+    model = tables.get(table)
+    if model is None:
+        abort(404)
+    lines = export_lines(model, to_json, with_expansions(model.query, model))
+    headers = {'Content-Disposition': f'attachment; filename={table}.ndjson'}
+    if request.accept_encodings.quality('gzip') > 0:
+        lines = gzipped(lines)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    return current_app.response_class(
+        stream_with_context(lines), headers=headers,
+        mimetype='application/x-ndjson')
@@ -0,0 +1,65 @@
+from flask import request
+from .. import db
+from ..exceptions import ValidationError
+from .conditional import make_etag
+from .response_cache import depends_on
+
+
+def requested_fields():
+    """Parse ``?fields=`` into the item's own fields and nested ones.
+
+    ``fields=body,author.username`` selects ``body`` on the item and
+    ``username`` on its expanded author. Returns ``(None, {})`` when the
+    parameter is absent, meaning every field.
+    """
+    value = request.args.get('fields')
+    if not value:
+        return None, {}
+    own, nested = set(), {}
+    for name in value.split(','):
+        relation, _, name = name.strip().rpartition('.')
+        if relation:
+            nested.setdefault(relation, set()).add(name)
+        elif name:
+            own.add(name)
+    return own, nested
+
+
+def requested_expansions(model):
+    names = {name.strip() for name in request.args.get('expand', '')
+             .split(',') if name.strip()}
+    unknown = {name for name in names if name != 'author'
+               or not hasattr(model, 'author')}
+    if unknown:
+        raise ValidationError('cannot expand ' + ', '.join(sorted(unknown)))
+    return names
+
+
+def with_expansions(query, model):
+    if 'author' in requested_expansions(model):
+        query = query.options(db.selectinload(model.author))
+    return query
+
+
+def to_json(item):
+    fields, nested = requested_fields()
+    expand = requested_expansions(type(item))
+    depends_on(item)
+    if 'author' in expand:
+        depends_on(item.author)
+    if not expand:
+        return item.to_json(fields)
+    return item.to_json(fields, {name: nested.get(name) for name in expand})
+
+
+def etag_parts(item):
+    if 'author' in requested_expansions(type(item)):
+        return item.etag_key, item.author.etag_key
+    return item.etag_key
+
+
+def resource_etag(item):
+    if 'fields' not in request.args and 'expand' not in request.args:
+        return make_etag(*item.etag_key)
+    return make_etag(etag_parts(item), request.args.get('fields'),
+                     request.args.get('expand'))
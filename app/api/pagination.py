@@ -0,0 +1,104 @@
+import base64
+import binascii
+import datetime
+import json
+from flask import jsonify, request, url_for
+from .. import db
+from ..counts import count, paginate
+from ..exceptions import ValidationError
+from .conditional import conditional, make_etag
+from .fields import etag_parts, to_json, with_expansions
+
+
+def encode_cursor(item, direction):
+    key = [item.timestamp.isoformat(), item.id, direction]
+    return base64.urlsafe_b64encode(
+        json.dumps(key).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        timestamp, id, direction = json.loads(
+            base64.urlsafe_b64decode(cursor + padding))
+        timestamp = datetime.datetime.fromisoformat(timestamp)
+    except (binascii.Error, ValueError, TypeError):
+        raise ValidationError('invalid cursor')
+    if not isinstance(id, int) or direction not in ('next', 'prev'):
+        raise ValidationError('invalid cursor')
+    return timestamp, id, direction
+
+
+def seek(query, key, cursor, per_page, ascending=False):
+    timestamp, id = key
+    forward = True
+    if cursor is not None:
+        cursor_timestamp, cursor_id, direction = decode_cursor(cursor)
+        forward = direction == 'next'
+        if ascending == forward:
+            query = query.filter(db.tuple_(timestamp, id) >
+                                 (cursor_timestamp, cursor_id))
+        else:
+            query = query.filter(db.tuple_(timestamp, id) <
+                                 (cursor_timestamp, cursor_id))
+    if ascending == forward:
+        query = query.order_by(timestamp.asc(), id.asc())
+    else:
+        query = query.order_by(timestamp.desc(), id.desc())
+    items = query.limit(per_page + 1).all()
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    if not forward:
+        items.reverse()
+    if forward:
+        return items, cursor is not None, has_more
+    return items, has_more, True
+
+
+def paginated(query, name, endpoint, key, per_page, ascending=False,
+              estimate=None, **values):
+    """Return the JSON response for one page of ``query``.
+
+    Pages are addressed with opaque ``cursor`` values that seek on
+    ``key`` (a ``(timestamp, id)`` column pair), so their cost does not
+    grow with depth. Requests that pass ``page`` keep the original
+    offset-based behaviour. Items honour ``?fields=`` and ``?expand=``.
+    The response carries an ETag built from the page's items and total,
+    so unchanged pages revalidate with a 304.
+    """
+    query = with_expansions(query, query.column_descriptions[0]['entity'])
+    prev = next = None
+    if 'page' in request.args:
+        page = request.args.get('page', 1, type=int)
+        order = [column.asc() if ascending else column.desc()
+                 for column in key]
+        pagination = paginate(query.order_by(*order), page, per_page,
+                              estimate=estimate)
+        items, total = pagination.items, pagination.total
+        has_prev, has_next = pagination.has_prev, pagination.has_next
+        if has_prev:
+            prev = url_for(endpoint, page=page-1, **values)
+        if has_next:
+            next = url_for(endpoint, page=page+1, **values)
+    else:
+        items, has_prev, has_next = seek(
+            query, key, request.args.get('cursor'), per_page,
+            ascending=ascending)
+        total = count(query, estimate=estimate)
+    prev_cursor = next_cursor = None
+    if has_prev and items:
+        prev_cursor = encode_cursor(items[0], 'prev')
+        prev = prev or url_for(endpoint, cursor=prev_cursor, **values)
+    if has_next and items:
+        next_cursor = encode_cursor(items[-1], 'next')
+        next = next or url_for(endpoint, cursor=next_cursor, **values)
+    etag = make_etag(request.full_path, total,
+                     [etag_parts(item) for item in items])
+    return conditional(etag, lambda: jsonify({
+        name: [to_json(item) for item in items],
+        'prev': prev,
+        'next': next,
+        'prev_cursor': prev_cursor,
+        'next_cursor': next_cursor,
+        'count': total
+    }))
@@ -2,35 +2,33 @@ from flask import jsonify, request, g, url_for, current_app
 from .. import db
 from ..models import Post, Permission
 from . import api
+from .batch import batch_items, create_many, get_many
 from .decorators import permission_required
-from .errors import forbidden
+from .pagination import paginated
+from ..counts import table_estimate
+from .conditional import conditional, make_etag, matches
+from .fields import resource_etag, to_json, with_expansions
+from .response_cache import cached_response
+from .errors import forbidden, precondition_failed
 
 
 @api.route('/posts/')
 def get_posts():
-    page = request.args.get('page', 1, type=int)
-    pagination = Post.query.paginate(
-        page, per_page=current_app.config['FLASKY_POSTS_PER_PAGE'],
-        error_out=False)
-    posts = pagination.items
-    prev = None
-    if pagination.has_prev:
-        prev = url_for('api.get_posts', page=page-1)
-    next = None
-    if pagination.has_next:
-        next = url_for('api.get_posts', page=page+1)
-    return jsonify({
-        'posts': [post.to_json() for post in posts],
-        'prev': prev,
-        'next': next,
-        'count': pagination.total
-    })
+    if 'ids' in request.args:
+        return get_many(Post, 'posts')
+    return paginated(
+        Post.query, 'posts', 'api.get_posts',
+        key=(Post.timestamp, Post.id),
+        per_page=current_app.config['FLASKY_POSTS_PER_PAGE'],
+        estimate=table_estimate('posts'))
 
 
 @api.route('/posts/<int:id>')
+@cached_response('posts:{id}')
 def get_post(id):
-    post = Post.query.get_or_404(id)
-    return jsonify(post.to_json())
+    post = with_expansions(Post.query, Post).get_or_404(id)
+    return conditional(resource_etag(post),
+                       lambda: jsonify(to_json(post)))
 
 
 @api.route('/posts/', methods=['POST'])
@@ -44,6 +42,15 @@ def new_post():
         {'Location': url_for('api.get_post', id=post.id)}
 
 
+@api.route('/posts/batch', methods=['POST'])
+@permission_required(Permission.WRITE)
+def new_posts():
+    def prepare(post):
+        post.author = g.current_user
+    return create_many(Post, batch_items('posts'), prepare, 'post',
+                       'api.get_post')
+
+
 @api.route('/posts/<int:id>', methods=['PUT'])
 @permission_required(Permission.WRITE)
 def edit_post(id):
@@ -51,7 +58,11 @@ def edit_post(id):
     if g.current_user != post.author and \
             not g.current_user.can(Permission.ADMIN):
         return forbidden('Insufficient permissions')
+    if request.if_match and not matches(make_etag(*post.etag_key)):
+        return precondition_failed('Post has been modified')
     post.body = request.json.get('body', post.body)
     db.session.add(post)
     db.session.commit()
-    return jsonify(post.to_json())
+    response = jsonify(post.to_json())
+    response.set_etag(make_etag(*post.etag_key))
+    return response
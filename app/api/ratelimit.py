@@ -0,0 +1,175 @@
+import math
+import threading
+import time
+from collections import Counter
+from flask import current_app, g, request
+from ..cache import LRUCache, SQLiteStore
+from . import api
+from .errors import too_many_requests
+
+
+def refill(state, capacity, rate, now):
+    if state is None:
+        return capacity
+    tokens, updated = state
+    return min(capacity, tokens + max(now - updated, 0) * rate)
+
+
+class MemoryBackend:
+    """Token buckets kept in this process only."""
+
+    def __init__(self):
+        self.buckets = LRUCache('rate_limits', maxsize=65536)
+        self._lock = threading.Lock()
+
+    def peek(self, key, capacity, rate, now):
+        with self._lock:
+            return refill(self.buckets.get(key), capacity, rate, now)
+
+    def take(self, buckets, now):
+        with self._lock:
+            tokens = [refill(self.buckets.get(key), capacity, rate, now)
+                      for key, capacity, rate in buckets]
+            allowed = all(available >= 1 for available in tokens)
+            if allowed:
+                tokens = [available - 1 for available in tokens]
+            for (key, _, _), available in zip(buckets, tokens):
+                self.buckets.set(key, (available, now))
+        return allowed, tokens
+
+
+class SQLiteBackend(SQLiteStore):
+    """Token buckets in a local SQLite file shared by all workers."""
+
+    schema = ('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, '
+              'tokens REAL NOT NULL, updated REAL NOT NULL)',)
+
+    def state(self, connection, key):
+        return connection.execute(
+            'SELECT tokens, updated FROM buckets WHERE key = ?',
+            (key,)).fetchone()
+
+    def peek(self, key, capacity, rate, now):
+        return refill(self.state(self.connection(), key), capacity, rate,
+                      now)
+
+    def take(self, buckets, now):
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            tokens = [refill(self.state(connection, key), capacity, rate,
+                             now)
+                      for key, capacity, rate in buckets]
+            allowed = all(available >= 1 for available in tokens)
+            if allowed:
+                tokens = [available - 1 for available in tokens]
+                connection.executemany(
+                    'INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)',
+                    [(key, available, now) for (key, _, _), available
+                     in zip(buckets, tokens)])
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return allowed, tokens
+
+
+backends = {}
+quota = Counter()
+
+
+def get_backend():
+    storage = current_app.config['FLASKY_RATE_LIMIT_STORAGE']
+    backend = backends.get(storage)
+    if backend is None:
+        if storage.startswith('sqlite:///'):
+            backend = SQLiteBackend(storage[len('sqlite:///'):])
+        else:
+            backend = MemoryBackend()
+        backends[storage] = backend
+    return backend
+
+
+def request_buckets(user=None):
+    """Return the rate limit group and buckets this request counts against.
+
+    Buckets are ``(key, capacity, rate)`` tuples: one for the client IP
+    and, once ``user`` has been authenticated, one for the user's id.
+    """
+    limits = current_app.config['FLASKY_RATE_LIMITS']
+    group = request.endpoint if request.endpoint in limits else 'default'
+    identities = {'ip': request.remote_addr or 'unknown'}
+    if user is not None and not user.is_anonymous:
+        identities['user'] = user.id
+    buckets = []
+    for scope, (limit, period) in limits.get(group, {}).items():
+        if scope in identities:
+            buckets.append((f'{scope}:{group}:{identities[scope]}', limit,
+                            limit / period))
+    return group, buckets
+
+
+def rejected(group, buckets, tokens):
+    quota[group, 'limited'] += 1
+    retry_after = max(math.ceil((1 - available) / rate)
+                      for (_, _, rate), available in zip(buckets, tokens)
+                      if available < 1)
+    response = too_many_requests('Rate limit exceeded', retry_after)
+    add_headers(response, headers(buckets, tokens))
+    return response
+
+
+def headers(buckets, tokens):
+    (_, limit, rate), remaining = min(zip(buckets, tokens),
+                                      key=lambda bucket: bucket[1])
+    return {'limit': limit, 'remaining': remaining,
+            'reset': math.ceil((limit - remaining) / rate)}
+
+
+@api.before_request
+def check_ip_limit():
+    """Turn away clients whose IP bucket is empty before authenticating.
+
+    Nothing is charged here, so this costs no database work; requests
+    are charged by ``rate_limit`` once authentication has run.
+    """
+    group, buckets = request_buckets()
+    if not buckets:
+        return
+    backend = get_backend()
+    now = time.time()
+    tokens = [backend.peek(key, capacity, rate, now)
+              for key, capacity, rate in buckets]
+    if any(available < 1 for available in tokens):
+        return rejected(group, buckets, tokens)
+
+
+def rate_limit(user=None):
+    """Charge the request to its IP bucket and to ``user``'s bucket.
+
+    Called after authentication, with the verified user on success and
+    with no user when credentials were rejected, so guessing at someone's
+    password never spends their quota. Tokens are taken from every bucket
+    or from none: a request turned away with a 429 costs nothing.
+    """
+    group, buckets = request_buckets(user)
+    if not buckets:
+        return
+    allowed, tokens = get_backend().take(buckets, time.time())
+    if not allowed:
+        return rejected(group, buckets, tokens)
+    quota[group, 'allowed'] += 1
+    g.rate_limit = headers(buckets, tokens)
+
+
+def add_headers(response, headers):
+    response.headers['RateLimit-Limit'] = str(headers['limit'])
+    response.headers['RateLimit-Remaining'] = str(int(headers['remaining']))
+    response.headers['RateLimit-Reset'] = str(headers['reset'])
+
+
+@api.after_request
+def rate_limit_headers(response):
+    if g.get('rate_limit'):
+        add_headers(response, g.rate_limit)
+    return response
@@ -0,0 +1,250 @@
+import itertools
+import pickle
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, has_app_context, make_response, request
+from sqlalchemy.orm import object_session
+from .. import db
+from ..cache import LRUCache, SQLiteStore, caches
+from ..models import Comment, Follow, Post, User
+from .conditional import conditional
+
+sequence = itertools.count(1)
+
+
+def version_key(model, id, *suffix):
+    return ':'.join([model.__tablename__, str(id), *suffix])
+
+
+class MemoryBackend(LRUCache):
+    """Responses and versions kept in this process only.
+
+    Versions are drawn from a process-wide sequence when first read, and
+    bumping one simply forgets it, so a version that is evicted and read
+    again can never match a response stored under its old value.
+    """
+
+    stale = 0
+
+    def __init__(self, maxsize):
+        super().__init__('responses', maxsize=maxsize)
+        self.versions = LRUCache('response_versions', maxsize=maxsize * 4)
+        self._versions_lock = threading.Lock()
+
+    def current(self, keys):
+        versions = []
+        with self._versions_lock:
+            for key in keys:
+                version = self.versions.get(key)
+                if version is None:
+                    version = next(sequence)
+                    self.versions.set(key, version)
+                versions.append(version)
+        return versions
+
+    def bump(self, keys):
+        with self._versions_lock:
+            for key in keys:
+                self.versions.delete(key)
+
+    def clear(self):
+        super().clear()
+        self.versions.clear()
+
+    def stats(self):
+        stats = super().stats()
+        stats['stale'] = self.stale
+        return stats
+
+
+class SQLiteBackend(SQLiteStore):
+    """Responses and versions in a local SQLite file shared by all workers.
+
+    When the file holds more than ``maxsize`` responses the ones closest
+    to expiring are evicted.
+    """
+
+    schema = ('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, '
+              'value BLOB NOT NULL, expires REAL NOT NULL)',
+              'CREATE TABLE IF NOT EXISTS versions (key TEXT PRIMARY KEY, '
+              'version INTEGER NOT NULL)')
+
+    def __init__(self, path, maxsize):
+        super().__init__(path)
+        self.name = 'responses'
+        self.maxsize = maxsize
+        self.hits = self.misses = self.evictions = self.stale = 0
+        caches[self.name] = self
+
+    def get(self, key):
+        row = self.connection().execute(
+            'SELECT value FROM responses WHERE key = ? AND expires > ?',
+            (key, time.time())).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl):
+        connection = self.connection()
+        now = time.time()
+        connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?)',
+                           (key, pickle.dumps(value), now + ttl))
+        connection.execute('DELETE FROM responses WHERE expires <= ?', (now,))
+        cursor = connection.execute(
+            'DELETE FROM responses WHERE key IN (SELECT key FROM responses '
+            'ORDER BY expires LIMIT max(0, (SELECT COUNT(*) FROM responses) '
+            '- ?))', (self.maxsize,))
+        self.evictions += cursor.rowcount
+
+    def current(self, keys):
+        keys = list(keys)
+        if not keys:
+            return []
+        found = dict(self.connection().execute(
+            'SELECT key, version FROM versions WHERE key IN (%s)'
+            % ', '.join('?' * len(keys)), keys))
+        return [found.get(key, 0) for key in keys]
+
+    def bump(self, keys):
+        self.connection().executemany(
+            'INSERT INTO versions VALUES (?, 1) '
+            'ON CONFLICT (key) DO UPDATE SET version = version + 1',
+            [(key,) for key in keys])
+
+    def clear(self):
+        connection = self.connection()
+        connection.execute('DELETE FROM responses')
+        connection.execute('DELETE FROM versions')
+
+    def __len__(self):
+        return self.connection().execute(
+            'SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def stats(self):
+        return {'size': len(self), 'maxsize': self.maxsize,
+                'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'stale': self.stale}
+
+
+backends = {}
+
+
+def get_backend():
+    config = current_app.config
+    storage = config['FLASKY_RESPONSE_CACHE_STORAGE']
+    backend = backends.get(storage)
+    if backend is None:
+        if storage.startswith('sqlite:///'):
+            backend = SQLiteBackend(storage[len('sqlite:///'):],
+                                    config['FLASKY_RESPONSE_CACHE_SIZE'])
+        else:
+            backend = MemoryBackend(config['FLASKY_RESPONSE_CACHE_SIZE'])
+        backends[storage] = backend
+    return backend
+
+
+def depends_on(item):
+    """Record ``item`` as a dependency of the response being cached.
+
+    The version is read now, before ``item`` is serialized, so a change
+    committed while the response is being built leaves it stale.
+    """
+    dependencies = g.get('response_dependencies')
+    if dependencies is not None:
+        key = version_key(type(item), item.id)
+        if key not in dependencies:
+            dependencies[key] = get_backend().current([key])[0]
+
+
+def cached_response(*keys):
+    """Serve a GET view from the response cache while its versions hold.
+
+    Responses are stored by path along with the versions they were built
+    from: ``keys``, formatted with the view arguments and read before the
+    view runs, and every item serialized through ``fields.to_json``. A
+    stored response is only served while all of those versions are
+    current.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            ttl = current_app.config['FLASKY_RESPONSE_CACHE_TTL']
+            if request.method != 'GET' or not ttl:
+                return f(*args, **kwargs)
+            backend = get_backend()
+            path = request.script_root + request.full_path
+            entry = backend.get(path)
+            if entry is not None:
+                dependencies, etag, last_modified, mimetype, body = entry
+                if backend.current(key for key, _ in dependencies) == \
+                        [version for _, version in dependencies]:
+                    return conditional(
+                        etag, lambda: current_app.response_class(
+                            body, mimetype=mimetype), last_modified)
+                backend.stale += 1
+            own = [key.format(**kwargs) for key in keys]
+            g.response_dependencies = dict(zip(own, backend.current(own)))
+            response = make_response(f(*args, **kwargs))
+            dependencies = tuple(g.pop('response_dependencies').items())
+            if response.status_code == 200 and not response.is_streamed:
+                backend.set(path, (dependencies, response.get_etag()[0],
+                                   response.last_modified, response.mimetype,
+                                   response.get_data()), ttl)
+            return response
+        return decorated_function
+    return decorator
+
+
+def touch(model, *ids):
+    """Bump the versions of ``model`` rows when the session commits.
+
+    For changes made with bulk statements, which bypass the listeners.
+    """
+    db.session.info.setdefault('response_versions', set()).update(
+        version_key(model, id) for id in ids)
+
+
+dependents = {
+    Post: lambda post: [version_key(Post, post.id),
+                        version_key(User, post.author_id),
+                        version_key(User, post.author_id, 'posts')],
+    Comment: lambda comment: [version_key(Comment, comment.id),
+                              version_key(Post, comment.post_id)],
+    User: lambda user: [version_key(User, user.id)],
+    Follow: lambda follow: [version_key(User, follow.follower_id),
+                            version_key(User, follow.followed_id)],
+}
+
+
+def on_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('response_versions', set()).update(
+            dependents[mapper.class_](target))
+
+
+def on_commit(session):
+    keys = session.info.pop('response_versions', None)
+    if keys and has_app_context():
+        get_backend().bump(keys)
+
+
+def on_rollback(session):
+    session.info.pop('response_versions', None)
+
+
+def clear(*args, **kwargs):
+    for backend in backends.values():
+        backend.clear()
+
+
+for model in dependents:
+    for event in ('after_insert', 'after_update', 'after_delete'):
+        db.event.listen(model, event, on_changed)
+db.event.listen(db.session, 'after_commit', on_commit)
+db.event.listen(db.session, 'after_rollback', on_rollback)
+db.event.listen(db.Model.metadata, 'after_create', clear)
+db.event.listen(db.Model.metadata, 'after_drop', clear)
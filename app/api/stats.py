@@ -0,0 +1,17 @@
+from flask import jsonify
+from . import api
+from .decorators import permission_required
+from ..cache import caches
+from ..models import Permission
+from .ratelimit import quota
+
+
+@api.route('/stats/')
+@permission_required(Permission.ADMIN)
+def get_stats():
+    rate_limits = {}
+    for (group, outcome), total in quota.items():
+        rate_limits.setdefault(group, {})[outcome] = total
+    return jsonify({'caches': {name: cache.stats()
+                               for name, cache in caches.items()},
+                    'rate_limits': rate_limits})
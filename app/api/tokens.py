@@ -0,0 +1,105 @@
+import hashlib
+import time
+from collections import defaultdict
+from flask import current_app
+from sqlalchemy.orm import object_session
+from .. import db
+from ..cache import LRUCache
+from ..identity import check_stamp, restore, stamped_caches
+from ..models import Role, User
+
+
+class TokenCache(LRUCache):
+    invalidations = 0
+
+    def stats(self):
+        stats = super().stats()
+        stats['invalidations'] = self.invalidations
+        return stats
+
+
+token_cache = TokenCache('tokens')
+stamped_caches.append(token_cache)
+generations = defaultdict(int)
+
+
+def snapshot(model, instance):
+    return {column.key: getattr(instance, column.key)
+            for column in model.__table__.columns
+            if column.key in ('id', 'role_id', 'confirmed', 'name',
+                              'default', 'permissions')}
+
+
+def verify_token(token):
+    """Return the user a bearer token belongs to, or ``None``.
+
+    Verified tokens are cached until their expiry (capped at
+    ``FLASKY_TOKEN_CACHE_TTL``) as a snapshot of the user's id, role and
+    confirmation. A hit is merged into the session without a query; any
+    other attribute loads from the database on first access. Changes
+    committed by this process invalidate entries by generation, and those
+    of other workers through the identity stamp.
+    """
+    check_stamp()
+    key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    token_cache.maxsize = current_app.config['FLASKY_TOKEN_CACHE_SIZE']
+    entry = token_cache.get(key)
+    if entry is not None:
+        user, role, generation = entry
+        if generation == generations[user['id']]:
+            if role is not None:
+                restore(Role, role)
+            return restore(User, user)
+    data = User.decode_auth_token(token)
+    if data is None:
+        return None
+    generation = generations[data.get('id')]
+    user = User.query.get(data.get('id'))
+    if user is None:
+        return None
+    ttl = min(data['exp'] - time.time(),
+              current_app.config['FLASKY_TOKEN_CACHE_TTL'])
+    if ttl > 0:
+        role = snapshot(Role, user.role) if user.role is not None else None
+        token_cache.set(key, (snapshot(User, user), role, generation),
+                        ttl=ttl)
+    return user
+
+
+def invalidate_user(mapper, connection, target):
+    object_session(target).info.setdefault('token_users', set()).add(
+        target.id)
+
+
+def on_user_updated(mapper, connection, target):
+    attrs = db.inspect(target).attrs
+    if any(attrs[name].history.has_changes()
+           for name in ('role_id', 'role', 'confirmed')):
+        invalidate_user(mapper, connection, target)
+
+
+def invalidate_roles(mapper, connection, target):
+    if db.inspect(target).attrs.permissions.history.has_changes():
+        object_session(target).info['token_roles'] = True
+
+
+def on_commit(session):
+    for user_id in session.info.pop('token_users', ()):
+        generations[user_id] += 1
+        token_cache.invalidations += 1
+    if session.info.pop('token_roles', False):
+        token_cache.clear()
+        token_cache.invalidations += 1
+
+
+def on_rollback(session):
+    session.info.pop('token_users', None)
+    session.info.pop('token_roles', None)
+
+
+db.event.listen(User, 'after_insert', invalidate_user)
+db.event.listen(User, 'after_update', on_user_updated)
+db.event.listen(User, 'after_delete', invalidate_user)
+db.event.listen(Role, 'after_update', invalidate_roles)
+db.event.listen(db.session, 'after_commit', on_commit)
+db.event.listen(db.session, 'after_rollback', on_rollback)
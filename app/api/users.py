@@ -1,53 +1,41 @@
-from flask import jsonify, request, current_app, url_for
+from flask import jsonify, current_app
 from . import api
-from ..models import User, Post
+from ..models import User, Post, Timeline
+from .batch import get_many
+from .conditional import conditional
+from .fields import resource_etag, to_json, with_expansions
+from .pagination import paginated
+from .response_cache import cached_response
+
+
+@api.route('/users/')
+def get_users():
+    return get_many(User, 'users')
 
 
 @api.route('/users/<int:id>')
+@cached_response('users:{id}')
 def get_user(id):
-    user = User.query.get_or_404(id)
-    return jsonify(user.to_json())
+    user = with_expansions(User.query, User).get_or_404(id)
+    return conditional(resource_etag(user),
+                       lambda: jsonify(to_json(user)))
 
 
 @api.route('/users/<int:id>/posts/')
+@cached_response('users:{id}:posts')
 def get_user_posts(id):
     user = User.query.get_or_404(id)
-    page = request.args.get('page', 1, type=int)
-    pagination = user.posts.order_by(Post.timestamp.desc()).paginate(
-        page, per_page=current_app.config['FLASKY_POSTS_PER_PAGE'],
-        error_out=False)
-    posts = pagination.items
-    prev = None
-    if pagination.has_prev:
-        prev = url_for('api.get_user_posts', id=id, page=page-1)
-    next = None
-    if pagination.has_next:
-        next = url_for('api.get_user_posts', id=id, page=page+1)
-    return jsonify({
-        'posts': [post.to_json() for post in posts],
-        'prev': prev,
-        'next': next,
-        'count': pagination.total
-    })
+    return paginated(
+        user.posts, 'posts', 'api.get_user_posts',
+        key=(Post.timestamp, Post.id),
+        per_page=current_app.config['FLASKY_POSTS_PER_PAGE'],
+        estimate=lambda: user.post_count, id=id)
 
 
 @api.route('/users/<int:id>/timeline/')
 def get_user_followed_posts(id):
     user = User.query.get_or_404(id)
-    page = request.args.get('page', 1, type=int)
-    pagination = user.followed_posts.order_by(Post.timestamp.desc()).paginate(
-        page, per_page=current_app.config['FLASKY_POSTS_PER_PAGE'],
-        error_out=False)
-    posts = pagination.items
-    prev = None
-    if pagination.has_prev:
-        prev = url_for('api.get_user_followed_posts', id=id, page=page-1)
-    next = None
-    if pagination.has_next:
-        next = url_for('api.get_user_followed_posts', id=id, page=page+1)
-    return jsonify({
-        'posts': [post.to_json() for post in posts],
-        'prev': prev,
-        'next': next,
-        'count': pagination.total
-    })
+    return paginated(
+        user.timeline, 'posts', 'api.get_user_followed_posts',
+        key=(Timeline.timestamp, Timeline.post_id),
+        per_page=current_app.config['FLASKY_POSTS_PER_PAGE'], id=id)
@@ -30,11 +30,12 @@ def register():
         user = User(username=form.username.data,
                     email=form.email.data, password=form.password.data)
         db.session.add(user)
-        db.session.commit()
+        db.session.flush()
 
         token = user.generate_confirmation_token()
         send_email(user.email, 'Confirm Your Account',
                    'mail/confirm', user=user, token=token)
+        db.session.commit()
         flash('A confirmation email has been sent to you by email.')
         return redirect(url_for("auth.login"))
     return render_template("pages/register.html", form=form)
@@ -85,5 +86,6 @@ def resend_confirmation():
     token = current_user.generate_confirmation_token()
     send_email(current_user.email, 'Confirm Your Account',
                'mail/confirm', user=current_user, token=token)
+    db.session.commit()
     flash('A new confirmation email has been sent to you by email.')
     return redirect(url_for('main.index'))
@@ -0,0 +1,144 @@
+import gzip
+import mimetypes
+import os
+from flask import current_app, request
+from .cache import LRUCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+encoders = {}
+if brotli is not None:
+    encoders['br'] = lambda data, level: brotli.compress(
+        data, quality=min(level, 11))
+if zstandard is not None:
+    encoders['zstd'] = lambda data, level: zstandard.ZstdCompressor(
+        level=level).compress(data)
+encoders['gzip'] = lambda data, level: gzip.compress(
+    data, compresslevel=min(level, 9), mtime=0)
+
+
+def etag_variants(etag):
+    """Return ``etag`` and the tags of its compressed representations."""
+    return [etag] + [f'{etag}-{encoding}' for encoding in encoders]
+
+
+class Compress:
+    """Negotiate gzip, and brotli or zstd when installed, for responses.
+
+    Bodies smaller than ``FLASKY_COMPRESS_MIN_SIZE`` or of types outside
+    ``FLASKY_COMPRESS_MIMETYPES`` are sent as they are. Compressed bodies
+    of responses with a strong ETag are cached by ETag and encoding, and
+    get that ETag suffixed with the encoding. Static files are compressed
+    once at startup and whenever they change.
+    """
+
+    def __init__(self):
+        self.cache = LRUCache('compressed', maxsize=256)
+        self.static = {}
+
+    def init_app(self, app):
+        app.after_request(self.after_request)
+        if app.static_folder and os.path.isdir(app.static_folder):
+            with app.app_context():
+                for root, dirs, files in os.walk(app.static_folder):
+                    for name in files:
+                        self.static_file(os.path.relpath(
+                            os.path.join(root, name), app.static_folder))
+
+    def compressible(self, mimetype):
+        return mimetype in current_app.config['FLASKY_COMPRESS_MIMETYPES']
+
+    def encode(self, data, encoding):
+        return encoders[encoding](
+            data, current_app.config['FLASKY_COMPRESS_LEVEL'])
+
+    def static_file(self, filename):
+        """Return ``{encoding: bytes}`` for a static file, or ``None``."""
+        path = os.path.join(current_app.static_folder, filename)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        entry = self.static.get(filename)
+        if entry is None or entry[0] != stat.st_mtime_ns:
+            variants = None
+            min_size = current_app.config['FLASKY_COMPRESS_MIN_SIZE']
+            if stat.st_size >= min_size and \
+                    self.compressible(mimetypes.guess_type(path)[0]):
+                with open(path, 'rb') as f:
+                    data = f.read()
+                variants = {encoding: self.encode(data, encoding)
+                            for encoding in encoders}
+            entry = self.static[filename] = (stat.st_mtime_ns, variants)
+        return entry[1]
+
+    def not_modified(self, response):
+        """Give a 304 the ETag of the encoded representation it validates.
+
+        Views answer conditional requests with the base ETag, while the
+        200 responses they stand for carried it suffixed with the encoding.
+        """
+        etag, weak = response.get_etag()
+        if not etag or weak or 'Content-Encoding' in response.headers:
+            return response
+        encoding = request.accept_encodings.best_match(list(encoders))
+        if encoding is not None and \
+                request.if_none_match.contains_weak(f'{etag}-{encoding}'):
+            response.set_etag(f'{etag}-{encoding}')
+            response.vary.add('Accept-Encoding')
+        return response
+
+    def after_request(self, response):
+        if response.status_code == 304:
+            return self.not_modified(response)
+        if not self.compressible(response.mimetype):
+            return response
+        response.vary.add('Accept-Encoding')
+        if response.status_code != 200 or \
+                'Content-Encoding' in response.headers:
+            return response
+        encoding = request.accept_encodings.best_match(list(encoders))
+        if encoding is None:
+            return response
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            tag = f'{etag}-{encoding}'
+            if request.if_none_match.contains_weak(tag):
+                response.status_code = 304
+                response.set_data(b'')
+                response.set_etag(tag)
+                return response
+        if request.endpoint == 'static':
+            variants = self.static_file(request.view_args['filename'])
+            if not variants:
+                return response
+            response.response.close()
+            response.direct_passthrough = False
+            response.response = [variants[encoding]]
+            response.content_length = len(variants[encoding])
+        else:
+            if response.is_streamed:
+                return response
+            data = response.get_data()
+            if len(data) < current_app.config['FLASKY_COMPRESS_MIN_SIZE']:
+                return response
+            compressed = None
+            if etag and not weak:
+                compressed = self.cache.get((etag, encoding))
+            if compressed is None:
+                compressed = self.encode(data, encoding)
+                if etag and not weak:
+                    self.cache.set((etag, encoding), compressed)
+            response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            response.set_etag(f'{etag}-{encoding}', weak)
+        return response
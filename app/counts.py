@@ -0,0 +1,112 @@
+from collections import defaultdict
+from flask import current_app, request
+from flask_sqlalchemy import Pagination
+from sqlalchemy.orm import object_session
+from sqlalchemy.sql.util import find_tables
+from . import db
+from .cache import LRUCache
+from .models import Comment, Follow, Post, RowCount
+
+count_cache = LRUCache('counts', maxsize=4096)
+generations = defaultdict(int)
+
+
+def exact_count(query):
+    return query.order_by(None).count()
+
+
+def cached_count(query):
+    statement = query.order_by(None).statement
+    compiled = statement.compile(dialect=db.engine.dialect)
+    tables = sorted({table.name for table in
+                     find_tables(statement, check_columns=True,
+                                 include_joins=True)})
+    key = (str(compiled), tuple(sorted(compiled.params.items())),
+           tuple(generations[table] for table in tables))
+    total = count_cache.get(key)
+    if total is None:
+        total = exact_count(query)
+        count_cache.set(key, total,
+                        ttl=current_app.config['FLASKY_COUNT_CACHE_TTL'])
+    return total
+
+
+def planner_count(query):
+    statement = query.order_by(None).statement
+    compiled = statement.compile(dialect=db.engine.dialect)
+    plan = db.session.connection().exec_driver_sql(
+        'EXPLAIN (FORMAT JSON) ' + str(compiled), compiled.params).scalar()
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def estimated_count(query, estimate=None):
+    if estimate is not None:
+        return estimate()
+    if db.engine.dialect.name == 'postgresql':
+        return planner_count(query)
+    return exact_count(query)
+
+
+def table_estimate(table_name):
+    def estimate():
+        if db.engine.dialect.name == 'postgresql':
+            return int(db.session.scalar(db.text(
+                'SELECT reltuples FROM pg_class WHERE relname = :name'),
+                {'name': table_name}))
+        return RowCount.get(table_name)
+    return estimate
+
+
+def count(query, estimate=None, endpoint=None):
+    """Return the total number of rows in ``query``.
+
+    The strategy comes from ``FLASKY_COUNT_STRATEGIES`` for the current
+    endpoint, falling back to ``FLASKY_COUNT_STRATEGY``. ``estimate`` is
+    an optional callable returning a maintained counter for the query,
+    used by the ``estimated`` strategy.
+    """
+    endpoint = endpoint or request.endpoint
+    strategy = current_app.config['FLASKY_COUNT_STRATEGIES'].get(
+        endpoint, current_app.config['FLASKY_COUNT_STRATEGY'])
+    if strategy == 'cached':
+        return cached_count(query)
+    if strategy == 'estimated':
+        return estimated_count(query, estimate)
+    return exact_count(query)
+
+
+def paginate(query, page, per_page, estimate=None, endpoint=None):
+    if page < 1:
+        page = 1
+    items = query.limit(per_page).offset((page - 1) * per_page).all()
+    if page == 1 and len(items) < per_page:
+        total = len(items)
+    else:
+        total = count(query, estimate=estimate, endpoint=endpoint)
+    return Pagination(query, page, per_page, total, items)
+
+
+def invalidate(*tables):
+    def listener(mapper, connection, target):
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault('count_tables', set()).update(tables)
+    return listener
+
+
+def on_commit(session):
+    for table in session.info.pop('count_tables', ()):
+        generations[table] += 1
+
+
+def on_rollback(session):
+    session.info.pop('count_tables', None)
+
+
+for model, tables in ((Post, ('posts', 'timelines')),
+                      (Comment, ('comments',)),
+                      (Follow, ('follows', 'timelines'))):
+    db.event.listen(model, 'after_insert', invalidate(*tables))
+    db.event.listen(model, 'after_delete', invalidate(*tables))
+db.event.listen(db.session, 'after_commit', on_commit)
+db.event.listen(db.session, 'after_rollback', on_rollback)
@@ -1,11 +1,147 @@
-from flask import current_app, render_template
+import datetime
+import smtplib
+import threading
+import uuid
+from flask import current_app, has_app_context, render_template
 from flask_mail import Message
-from . import mail
+from . import db, mail
+from .models import OutboxMessage
+
+
+class OutboxWorker:
+    """Background thread that delivers queued emails.
+
+    The thread is started by the first ``send_email`` in a process and
+    then wakes up on every new message, or every
+    ``FLASKY_MAIL_POLL_INTERVAL`` seconds to pick up retries.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.thread = None
+        self.wakeup = threading.Event()
+        self._lock = threading.Lock()
+
+    def wake(self):
+        self.app = current_app._get_current_object()
+        with self._lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='outbox',
+                                               daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.app.config['FLASKY_MAIL_POLL_INTERVAL'])
+            self.wakeup.clear()
+            with self.app.app_context():
+                try:
+                    while deliver_pending():
+                        pass
+                except Exception:
+                    self.app.logger.exception('Could not deliver the outbox')
+
+
+outbox_worker = OutboxWorker()
+
+
+def to_message(message):
+    return Message(message.subject, sender=message.sender,
+                   recipients=[message.recipient], body=message.body,
+                   html=message.html)
+
+
+def claim_pending(limit):
+    """Lease up to ``limit`` due messages to this caller and return them."""
+    config = current_app.config
+    now = datetime.datetime.utcnow()
+    outbox = OutboxMessage.__table__
+    claim = uuid.uuid4().hex
+    due = db.select(outbox.c.id).where(outbox.c.next_attempt <= now)\
+        .order_by(outbox.c.next_attempt).limit(limit)
+    db.session.execute(
+        outbox.update()
+        .where(outbox.c.id.in_(db.session.scalars(due).all()))
+        .where(outbox.c.next_attempt <= now)
+        .values(claim=claim, next_attempt=now + datetime.timedelta(
+            seconds=config['FLASKY_MAIL_LEASE'])))
+    db.session.commit()
+    return OutboxMessage.query.filter_by(claim=claim)\
+        .order_by(OutboxMessage.id).all()
+
+
+def retry_later(message, error):
+    config = current_app.config
+    message.attempts += 1
+    message.last_error = repr(error)
+    if message.attempts >= config['FLASKY_MAIL_MAX_ATTEMPTS']:
+        message.next_attempt = None
+        current_app.logger.error(
+            f'Giving up on email {message.id} to {message.recipient}: '
+            f'{error!r}')
+        return
+    delay = config['FLASKY_MAIL_RETRY_DELAY'] * 2 ** (message.attempts - 1)
+    message.next_attempt = datetime.datetime.utcnow() + \
+        datetime.timedelta(seconds=delay)
+
+
+def deliver_pending(limit=None):
+    """Send the due outbox messages over a single SMTP connection.
+
+    Delivered messages are deleted; failed ones are rescheduled with
+    exponential backoff until ``FLASKY_MAIL_MAX_ATTEMPTS`` is reached.
+    Returns the number of messages that were attempted.
+    """
+    messages = claim_pending(
+        limit or current_app.config['FLASKY_MAIL_BATCH_SIZE'])
+    if not messages:
+        return 0
+    pending = list(messages)
+    try:
+        with mail.connect() as connection:
+            while pending:
+                message = pending[0]
+                try:
+                    connection.send(to_message(message))
+                except smtplib.SMTPServerDisconnected:
+                    raise
+                except smtplib.SMTPException as e:
+                    retry_later(message, e)
+                else:
+                    db.session.delete(message)
+                pending.pop(0)
+    except OSError as e:
+        for message in pending:
+            retry_later(message, e)
+    db.session.commit()
+    return len(messages)
 
 
 def send_email(to, subject, template, **kwargs):
-    msg = Message(current_app.config['FLASKY_MAIL_SUBJECT_PREFIX'] + subject,
-                  sender=current_app.config['FLASKY_MAIL_SENDER'], recipients=[to])
-    msg.body = render_template(template + '.txt', **kwargs)
-    msg.html = render_template(template + '.html', **kwargs)
-    mail.send(msg)
+    """Queue an email in the outbox of the current session.
+
+    The message is only added, so it is stored atomically with the rest of
+    the caller's changes when the caller commits, and the worker is woken
+    up once that commit has happened.
+    """
+    db.session.add(OutboxMessage(
+        sender=current_app.config['FLASKY_MAIL_SENDER'], recipient=to,
+        subject=current_app.config['FLASKY_MAIL_SUBJECT_PREFIX'] + subject,
+        body=render_template(template + '.txt', **kwargs),
+        html=render_template(template + '.html', **kwargs)))
+    db.session.info['outbox_queued'] = True
+
+
+def on_commit(session):
+    if session.info.pop('outbox_queued', False) and has_app_context() \
+            and current_app.config['FLASKY_MAIL_WORKER']:
+        outbox_worker.wake()
+
+
+def on_rollback(session):
+    session.info.pop('outbox_queued', None)
+
+
+db.event.listen(db.session, 'after_commit', on_commit)
+db.event.listen(db.session, 'after_rollback', on_rollback)
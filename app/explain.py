@@ -0,0 +1,86 @@
+import datetime
+from flask import current_app
+from . import db
+from .models import Comment, Follow, Post, Timeline, User
+
+
+def hot_queries():
+    user_id = db.session.scalar(db.select(User.id).order_by(
+        User.post_count.desc()).limit(1)) or 1
+    post_id = db.session.scalar(db.select(Post.id).order_by(
+        Post.comment_count.desc()).limit(1)) or 1
+    posts = Post.query.filter_by(author_id=user_id)
+    comments = Comment.query.filter_by(post_id=post_id)
+    timeline = Post.query.join(Timeline, Timeline.post_id == Post.id)\
+        .filter(Timeline.user_id == user_id)
+    posts_per_page = current_app.config['FLASKY_POSTS_PER_PAGE']
+    comments_per_page = current_app.config['FLASKY_COMMENTS_PER_PAGE']
+    follows_per_page = current_app.config['FLASKY_FOLLOWERS_PER_PAGE']
+    now = datetime.datetime.utcnow()
+    return [
+        ('main.index', Post.query.order_by(Post.timestamp.desc())
+         .limit(posts_per_page)),
+        ('main.index (followed)', timeline
+         .order_by(Timeline.timestamp.desc()).limit(posts_per_page)),
+        ('main.user', posts.order_by(Post.timestamp.desc())),
+        ('main.post', comments.order_by(Comment.timestamp.asc())
+         .limit(comments_per_page)),
+        ('main.moderate', Comment.query.order_by(Comment.timestamp.desc())
+         .limit(comments_per_page)),
+        ('main.moderate (disabled)', Comment.query.filter_by(disabled=True)
+         .order_by(Comment.timestamp.desc()).limit(comments_per_page)),
+        ('main.followers', Follow.query.filter_by(followed_id=user_id)
+         .limit(follows_per_page)),
+        ('main.followed_by', Follow.query.filter_by(follower_id=user_id)
+         .limit(follows_per_page)),
+        ('api.get_posts', Post.query
+         .filter(db.tuple_(Post.timestamp, Post.id) < (now, post_id))
+         .order_by(Post.timestamp.desc(), Post.id.desc())
+         .limit(posts_per_page + 1)),
+        ('api.get_user_posts', posts
+         .filter(db.tuple_(Post.timestamp, Post.id) < (now, post_id))
+         .order_by(Post.timestamp.desc(), Post.id.desc())
+         .limit(posts_per_page + 1)),
+        ('api.get_user_followed_posts', timeline
+         .filter(db.tuple_(Timeline.timestamp, Timeline.post_id) <
+                 (now, post_id))
+         .order_by(Timeline.timestamp.desc(), Timeline.post_id.desc())
+         .limit(posts_per_page + 1)),
+        ('api.get_comments', Comment.query
+         .filter(db.tuple_(Comment.timestamp, Comment.id) < (now, 0))
+         .order_by(Comment.timestamp.desc(), Comment.id.desc())
+         .limit(comments_per_page + 1)),
+        ('api.get_post_comments', comments
+         .filter(db.tuple_(Comment.timestamp, Comment.id) >
+                 (datetime.datetime.min, 0))
+         .order_by(Comment.timestamp.asc(), Comment.id.asc())
+         .limit(comments_per_page + 1)),
+    ]
+
+
+def pg_plan_nodes(node):
+    relation = node.get('Relation Name')
+    yield node['Node Type'] + (' on ' + relation if relation else '')
+    for child in node.get('Plans', []):
+        yield from pg_plan_nodes(child)
+
+
+def query_plan(query):
+    dialect = db.engine.dialect
+    connection = db.session.connection()
+    if dialect.name == 'postgresql':
+        compiled = query.statement.compile(dialect=dialect)
+        plan = connection.exec_driver_sql(
+            'EXPLAIN (FORMAT JSON) ' + str(compiled),
+            compiled.params).scalar()
+        return list(pg_plan_nodes(plan[0]['Plan']))
+    compiled = query.statement.compile(
+        dialect=dialect, compile_kwargs={'literal_binds': True})
+    return [row[-1] for row in connection.exec_driver_sql(
+        'EXPLAIN QUERY PLAN ' + str(compiled))]
+
+
+def is_sequential_scan(step):
+    if step.startswith('Seq Scan'):
+        return True
+    return step.startswith('SCAN ') and ' USING ' not in step
@@ -0,0 +1,52 @@
+import zlib
+from flask import current_app
+from . import db
+from .models import Comment, Post, User
+
+tables = {'posts': Post, 'comments': Comment, 'users': User}
+
+
+def chunks(query, model, size):
+    """Yield lists of rows from ``query`` in primary key order.
+
+    Each chunk seeks past the last id of the previous one, so the cost
+    per chunk stays flat however deep the export goes. The rows are
+    loaded through a dedicated read-only session that is cleared once
+    each chunk is consumed, which keeps it from growing without detaching
+    anything the request session holds, such as the current user.
+    """
+    session = db.create_session({'autoflush': False})()
+    query = query.with_session(session)
+    last_id = None
+    try:
+        while True:
+            chunk = query
+            if last_id is not None:
+                chunk = chunk.filter(model.id > last_id)
+            chunk = chunk.order_by(model.id).limit(size).all()
+            if not chunk:
+                return
+            last_id = chunk[-1].id
+            yield chunk
+            session.expunge_all()
+    finally:
+        session.close()
+
+
+def export_lines(model, serialize=None, query=None):
+    """Yield one NDJSON line per row of ``model``."""
+    serialize = serialize or (lambda item: item.to_json())
+    query = query if query is not None else model.query
+    for chunk in chunks(query, model,
+                        current_app.config['FLASKY_EXPORT_CHUNK_SIZE']):
+        yield ''.join(current_app.json.dumps(serialize(item)) + '\n'
+                      for item in chunk).encode('utf-8')
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
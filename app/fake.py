@@ -5,6 +5,7 @@ from sqlalchemy.exc import IntegrityError
 from faker import Faker
 from . import db
 from .models import User, Post
+from .rendering import render_many
 
 
 def users(count=100):
@@ -27,15 +28,18 @@ def users(count=100):
             db.session.rollback()
 
 
-def posts(count=100):
+def posts(count=100, batch=500):
     fake = Faker()
     user_count = User.query.count()
-    for i in range(count):
-        u = User.query.offset(randint(0, user_count - 1)).first()
-        p = Post(body=fake.text(),
-                 timestamp=fake.past_date(),
-                 author=u)
-        db.session.add(p)
+    for start in range(0, count, batch):
+        bodies = [fake.text() for i in range(min(batch, count - start))]
+        render_many(bodies, Post.allowed_tags)
+        for body in bodies:
+            u = User.query.offset(randint(0, user_count - 1)).first()
+            p = Post(body=body,
+                     timestamp=fake.past_date(),
+                     author=u)
+            db.session.add(p)
     db.session.commit()
 
 
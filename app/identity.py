@@ -0,0 +1,131 @@
+import os
+from flask import current_app, has_app_context
+from sqlalchemy.orm import make_transient_to_detached, object_session
+from sqlalchemy.orm.attributes import set_committed_value
+from . import db
+from .cache import LRUCache
+
+user_columns = ('id', 'username', 'email', 'avatar_hash', 'role_id',
+                'confirmed')
+users = LRUCache('users', maxsize=4096)
+roles = {}
+stamp = None
+# caches built from identity rows, all dropped when the stamp moves
+stamped_caches = [users]
+
+
+def restore(model, values):
+    """Attach a cached row to the session without querying for it."""
+    instance = model.__mapper__.class_manager.new_instance()
+    for key, value in values.items():
+        set_committed_value(instance, key, value)
+    make_transient_to_detached(instance)
+    return db.session.merge(instance, load=False)
+
+
+def clear():
+    global roles
+    roles = {}
+    for cache in stamped_caches:
+        cache.clear()
+
+
+def check_stamp():
+    global stamp
+    path = current_app.config['FLASKY_IDENTITY_STAMP']
+    if not path:
+        return
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    if mtime != stamp:
+        stamp = mtime
+        clear()
+
+
+def touch_stamp():
+    path = current_app.config['FLASKY_IDENTITY_STAMP']
+    if path:
+        try:
+            with open(path, 'a'):
+                os.utime(path)
+        except OSError as e:
+            current_app.logger.warning(
+                f'Could not touch the identity stamp {path}: {e}')
+
+
+def role_rows():
+    global roles
+    check_stamp()
+    if not roles:
+        from .models import Role
+        rows = db.session.execute(db.select(
+            Role.id, Role.name, Role.default, Role.permissions))
+        roles = {row.id: row._asdict() for row in rows}
+    return roles
+
+
+def permissions(role_id):
+    row = role_rows().get(role_id)
+    return row['permissions'] if row is not None else 0
+
+
+def find_role(**criteria):
+    from .models import Role
+    for row in role_rows().values():
+        if all(row[key] == value for key, value in criteria.items()):
+            return restore(Role, row)
+    return None
+
+
+def get_user(user_id):
+    """Return the user with ``user_id``, loading it at most once per TTL.
+
+    Only identity columns are cached; counters and profile fields are
+    left unloaded and fetched from the database if a view reads them.
+    """
+    from .models import User
+    check_stamp()
+    values = users.get(user_id)
+    if values is not None:
+        return restore(User, values)
+    user = db.session.get(User, user_id)
+    if user is not None:
+        users.set(user_id, {key: getattr(user, key) for key in user_columns},
+                  ttl=current_app.config['FLASKY_IDENTITY_CACHE_TTL'])
+    return user
+
+
+def forget_user(user):
+    """Drop ``user`` from the cache once its session commits."""
+    object_session(user).info.setdefault('identity_users', set()).add(
+        user.id)
+
+
+def forget_roles(role):
+    """Drop the cached roles once ``role``'s session commits."""
+    object_session(role).info['identity_roles'] = True
+
+
+def on_commit(session):
+    global roles
+    user_ids = session.info.pop('identity_users', None)
+    roles_changed = session.info.pop('identity_roles', False)
+    if not user_ids and not roles_changed:
+        return
+    for user_id in user_ids or ():
+        users.delete(user_id)
+    if roles_changed:
+        roles = {}
+    if has_app_context():
+        touch_stamp()
+
+
+def on_rollback(session):
+    session.info.pop('identity_users', None)
+    session.info.pop('identity_roles', None)
+
+
+db.event.listen(db.session, 'after_commit', on_commit)
+db.event.listen(db.session, 'after_rollback', on_rollback)
@@ -2,7 +2,7 @@ from flask import Blueprint  # nopep8
 
 main = Blueprint('main', __name__)
 
-from . import views, errors  # nopep8
+from . import views, errors, fragments  # nopep8
 from ..models import Permission  # nopep8
 
 
@@ -0,0 +1,21 @@
+from flask import current_app
+from markupsafe import Markup
+from . import main
+from ..cache import LRUCache
+
+fragment_cache = LRUCache('fragments', maxsize=4096)
+
+
+@main.app_template_global()
+def cached_fragment(*key, caller):
+    """Render the body of a ``{% call %}`` block once per ``key``.
+
+    Keys must change whenever the fragment's content does, typically by
+    including the row's id and version.
+    """
+    html = fragment_cache.get(key)
+    if html is None:
+        html = str(caller())
+        fragment_cache.set(
+            key, html, ttl=current_app.config['FLASKY_FRAGMENT_CACHE_TTL'])
+    return Markup(html)
@@ -0,0 +1,76 @@
+from functools import wraps
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from sqlalchemy.orm import object_session
+from .. import db
+from ..cache import LRUCache
+from ..models import Comment, Follow, Post, User
+
+page_cache = LRUCache('pages', maxsize=1024)
+generation = 0
+profile_columns = ('username', 'avatar_hash', 'name', 'location', 'about_me',
+                   'last_seen')
+
+
+def cached_page(f):
+    """Serve anonymous GET requests for the view from a page cache.
+
+    TTLs are configured per endpoint in ``FLASKY_PAGE_CACHE_TTL``. Cached
+    pages are dropped when a session commits changes to posts, comments,
+    follows or user profiles.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        ttl = current_app.config['FLASKY_PAGE_CACHE_TTL'].get(request.endpoint)
+        if request.method != 'GET' or not ttl or \
+                current_user.is_authenticated or '_flashes' in session:
+            response = make_response(f(*args, **kwargs))
+            if request.method == 'GET':
+                response.cache_control.private = True
+                response.vary.add('Cookie')
+            return response
+        key = (request.full_path, generation)
+        page = page_cache.get(key)
+        if page is None:
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            page = (response.get_data(), response.mimetype)
+            page_cache.set(key, page, ttl=ttl)
+        response = current_app.response_class(page[0], mimetype=page[1])
+        response.cache_control.public = True
+        response.cache_control.max_age = ttl
+        response.vary.add('Cookie')
+        return response
+    return decorated_function
+
+
+def invalidate(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info['pages_changed'] = True
+
+
+def on_user_updated(mapper, connection, target):
+    attrs = db.inspect(target).attrs
+    if any(attrs[name].history.has_changes() for name in profile_columns):
+        invalidate(mapper, connection, target)
+
+
+def on_commit(session):
+    global generation
+    if session.info.pop('pages_changed', False):
+        generation += 1
+
+
+def on_rollback(session):
+    session.info.pop('pages_changed', None)
+
+
+for model in (Post, Comment, Follow):
+    for event in ('after_insert', 'after_update', 'after_delete'):
+        db.event.listen(model, event, invalidate)
+db.event.listen(User, 'after_update', on_user_updated)
+db.event.listen(User, 'after_delete', invalidate)
+db.event.listen(db.session, 'after_commit', on_commit)
+db.event.listen(db.session, 'after_rollback', on_rollback)
@@ -3,12 +3,15 @@ from flask_login import login_required, current_user
 from flask_sqlalchemy import get_debug_queries
 from .. import db
 from . import main
+from .page_cache import cached_page
+from ..counts import paginate, table_estimate
 from ..decorators import admin_required, permission_required
 from ..models import *
 from .forms import *
 
 
 @main.route('/', methods=['GET', 'POST'])
+@cached_page
 def index():
     form = PostForm()
     if current_user.can(Permission.WRITE) and form.validate_on_submit():
@@ -22,12 +25,14 @@ def index():
     if current_user.is_authenticated:
         show_followed = bool(request.cookies.get('show_followed', ''))
     if show_followed:
-        query = current_user.followed_posts
+        query = current_user.timeline.order_by(Timeline.timestamp.desc())
+        estimate = None
     else:
-        query = Post.query
-    pagination = query.order_by(Post.timestamp.desc()).paginate(
-        page, per_page=current_app.config['FLASKY_POSTS_PER_PAGE'],
-        error_out=False)
+        query = Post.query.order_by(Post.timestamp.desc())
+        estimate = table_estimate('posts')
+    pagination = paginate(
+        query.options(with_authors(Post)), page,
+        current_app.config['FLASKY_POSTS_PER_PAGE'], estimate=estimate)
     posts = pagination.items
     return render_template('pages/index.html', form=form, posts=posts,
                            show_followed=show_followed, pagination=pagination)
@@ -41,11 +46,13 @@ def for_admins_only():
 
 
 @main.route('/user/<username>')
+@cached_page
 def user(username):
     user = User.query.filter_by(username=username).first()
     if user is None:
         abort(404)
-    posts = user.posts.order_by(Post.timestamp.desc()).all()
+    posts = user.posts.order_by(Post.timestamp.desc())\
+        .options(with_authors(Post)).all()
     return render_template('pages/user.html', user=user, posts=posts)
 
 
@@ -154,9 +161,9 @@ def followers(username):
         flash('Invalid user.')
         return redirect(url_for('.index'))
     page = request.args.get('page', 1, type=int)
-    pagination = user.followers.paginate(
-        page, per_page=current_app.config['FLASKY_FOLLOWERS_PER_PAGE'],
-        error_out=False)
+    pagination = paginate(
+        user.followers, page, current_app.config['FLASKY_FOLLOWERS_PER_PAGE'],
+        estimate=lambda: user.follower_count)
     follows = [{'user': item.follower, 'timestamp': item.timestamp}
                for item in pagination.items]
     return render_template('pages/followers.html', user=user, title="Followers of",
@@ -171,9 +178,9 @@ def followed_by(username):
         flash('Invalid user.')
         return redirect(url_for('.index'))
     page = request.args.get('page', 1, type=int)
-    pagination = user.followed.paginate(
-        page, per_page=current_app.config['FLASKY_FOLLOWERS_PER_PAGE'],
-        error_out=False)
+    pagination = paginate(
+        user.followed, page, current_app.config['FLASKY_FOLLOWERS_PER_PAGE'],
+        estimate=lambda: user.followed_count)
     follows = [{'user': item.followed, 'timestamp': item.timestamp}
                for item in pagination.items]
     return render_template('pages/followers.html', user=user, title="Followed by",
@@ -198,6 +205,7 @@ def show_followed():
 
 
 @main.route('/post/<int:id>', methods=['GET', 'POST'])
+@cached_page
 def post(id):
     post = Post.query.get_or_404(id)
     form = CommentForm()
@@ -211,11 +219,13 @@ def post(id):
         return redirect(url_for('.post', id=post.id, page=-1))
     page = request.args.get('page', 1, type=int)
     if page == -1:
-        page = (post.comments.count() - 1) // \
+        page = (post.comment_count - 1) // \
             current_app.config['FLASKY_COMMENTS_PER_PAGE'] + 1
-    pagination = post.comments.order_by(Comment.timestamp.asc()).paginate(
-        page, per_page=current_app.config['FLASKY_COMMENTS_PER_PAGE'],
-        error_out=False)
+    pagination = paginate(
+        post.comments.order_by(Comment.timestamp.asc())
+        .options(with_authors(Comment)), page,
+        current_app.config['FLASKY_COMMENTS_PER_PAGE'],
+        estimate=lambda: post.comment_count)
     comments = pagination.items
     return render_template('pages/post.html', posts=[post], form=form,
                            comments=comments, pagination=pagination)
@@ -226,9 +236,11 @@ def post(id):
 @permission_required(Permission.MODERATE)
 def moderate():
     page = request.args.get('page', 1, type=int)
-    pagination = Comment.query.order_by(Comment.timestamp.desc()).paginate(
-        page, per_page=current_app.config['FLASKY_COMMENTS_PER_PAGE'],
-        error_out=False)
+    pagination = paginate(
+        Comment.query.order_by(Comment.timestamp.desc())
+        .options(with_authors(Comment)), page,
+        current_app.config['FLASKY_COMMENTS_PER_PAGE'],
+        estimate=table_estimate('comments'))
     comments = pagination.items
     return render_template('pages/moderate.html', comments=comments,
                            pagination=pagination, page=page)
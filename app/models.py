@@ -3,14 +3,50 @@ from email.policy import default
 from werkzeug.security import generate_password_hash, check_password_hash
 import datetime
 import jwt
-from flask import current_app, url_for
+from flask import current_app
 from flask_login import UserMixin, AnonymousUserMixin
-from markdown import markdown
-import bleach
 from . import db
+from . import identity
+from . import urls
 from . import login_manager
 
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.attributes import set_committed_value
 from app.exceptions import ValidationError
+from app.presence import last_seen_buffer
+from app.rendering import render_markdown
+
+
+def increment(connection, model, id, **deltas):
+    if id is None:
+        return
+    table = model.__table__
+    connection.execute(table.update().where(table.c.id == id).values(
+        {table.c[name]: table.c[name] + delta
+         for name, delta in deltas.items()}))
+
+
+def bump_version(mapper, connection, target):
+    target.version = (target.version or 0) + 1
+
+
+def changed_columns(target):
+    """Return the names of ``target``'s columns changed in this flush."""
+    state = db.inspect(target)
+    return {attr.key for attr in state.mapper.column_attrs
+            if attr.key != 'version' and
+            state.attrs[attr.key].history.has_changes()}
+
+
+def serialize(item, selected=None):
+    """Build a JSON dict from the model's ``json_fields``.
+
+    Only the fields named in ``selected`` are evaluated; all of them are
+    when it is ``None``.
+    """
+    return {name: value(item) for name, value in type(item).json_fields.items()
+            if selected is None or name in selected}
 
 
 class Permission:
@@ -84,6 +120,15 @@ class Role(db.Model):
     def has_permission(self, perm):
         return self.permissions & perm == perm
 
+    @staticmethod
+    def on_changed(mapper, connection, target):
+        identity.forget_roles(target)
+
+
+db.event.listen(Role, 'after_insert', Role.on_changed)
+db.event.listen(Role, 'after_update', Role.on_changed)
+db.event.listen(Role, 'after_delete', Role.on_changed)
+
 
 class Follow(db.Model):
     __tablename__ = 'follows'
@@ -92,6 +137,27 @@ class Follow(db.Model):
     followed_id = db.Column(db.Integer, db.ForeignKey('users.id'),
                             primary_key=True)
     timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_follows_followed_id_follower_id',
+                 'followed_id', 'follower_id',
+                 postgresql_include=['timestamp']),
+    )
+
+    @staticmethod
+    def on_inserted(mapper, connection, target):
+        increment(connection, User, target.follower_id, followed_count=1)
+        increment(connection, User, target.followed_id, follower_count=1)
+        Timeline.backfill(connection, target.follower_id, target.followed_id)
+
+    @staticmethod
+    def on_deleted(mapper, connection, target):
+        increment(connection, User, target.follower_id, followed_count=-1)
+        increment(connection, User, target.followed_id, follower_count=-1)
+        Timeline.prune(connection, target.follower_id, target.followed_id)
+
+
+db.event.listen(Follow, 'after_insert', Follow.on_inserted)
+db.event.listen(Follow, 'after_delete', Follow.on_deleted)
 
 
 class User(UserMixin, db.Model):
@@ -108,6 +174,10 @@ class User(UserMixin, db.Model):
     avatar_hash = db.Column(db.String(32))
     member_since = db.Column(db.DateTime(), default=datetime.datetime.utcnow)
     last_seen = db.Column(db.DateTime(), default=datetime.datetime.utcnow)
+    post_count = db.Column(db.Integer, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, default=0, server_default='0')
+    follower_count = db.Column(db.Integer, default=0, server_default='0')
+    followed_count = db.Column(db.Integer, default=0, server_default='0')
     posts = db.relationship('Post', backref='author', lazy='dynamic')
     comments = db.relationship('Comment', backref='author', lazy='dynamic')
     followed = db.relationship('Follow',
@@ -125,9 +195,9 @@ class User(UserMixin, db.Model):
         super(User, self).__init__(**kwargs)
         if self.role is None:
             if self.email == current_app.config['FLASKY_ADMIN']:
-                self.role = Role.query.filter_by(name='Administrator').first()
+                self.role = identity.find_role(name='Administrator')
             if self.role is None:
-                self.role = Role.query.filter_by(default=True).first()
+                self.role = identity.find_role(default=True)
             if self.email is not None and self.avatar_hash is None:
                 self.avatar_hash = self.gravatar_hash()
 
@@ -171,15 +241,17 @@ class User(UserMixin, db.Model):
         return True
 
     def can(self, perm):
-        return self.role is not None and self.role.has_permission(perm)
+        if 'role' not in db.inspect(self).unloaded:
+            return self.role is not None and self.role.has_permission(perm)
+        return identity.permissions(self.role_id) & perm == perm
 
     def is_administrator(self):
         return self.can(Permission.ADMIN)
 
     def ping(self):
-        self.last_seen = datetime.datetime.now()
-        db.session.add(self)
-        db.session.commit()
+        now = datetime.datetime.now()
+        if last_seen_buffer.record(self.id, now):
+            set_committed_value(self, 'last_seen', now)
 
     def gravatar_hash(self):
         return hashlib.md5(self.email.lower().encode('utf-8')).hexdigest()
@@ -217,17 +289,31 @@ class User(UserMixin, db.Model):
         return Post.query.join(Follow, Follow.followed_id == Post.author_id)\
             .filter(Follow.follower_id == self.id)
 
-    def to_json(self):
-        json_user = {
-            'url': url_for('api.get_user', id=self.id),
-            'username': self.username,
-            'member_since': self.member_since,
-            'last_seen': self.last_seen,
-            'posts_url': url_for('api.get_user_posts', id=self.id),
-            'followed_posts_url': url_for('api.get_user_followed_posts',
-                                          id=self.id),
-            'post_count': self.posts.count()
-        }
+    @property
+    def timeline(self):
+        return Post.query.join(Timeline, Timeline.post_id == Post.id)\
+            .filter(Timeline.user_id == self.id)
+
+    @property
+    def etag_key(self):
+        return ('user', self.id, self.username, self.last_seen,
+                self.post_count)
+
+    json_fields = {
+        'id': lambda user: user.id,
+        'url': lambda user: urls.build('api.get_user', id=user.id),
+        'username': lambda user: user.username,
+        'member_since': lambda user: user.member_since,
+        'last_seen': lambda user: user.last_seen,
+        'posts_url': lambda user: urls.build('api.get_user_posts',
+                                             id=user.id),
+        'followed_posts_url': lambda user: urls.build(
+            'api.get_user_followed_posts', id=user.id),
+        'post_count': lambda user: user.post_count
+    }
+
+    def to_json(self, fields=None):
+        json_user = serialize(self, fields)
         return json_user
 
     def generate_auth_token(self, expiration=3600):
@@ -243,18 +329,59 @@ class User(UserMixin, db.Model):
         return token
 
     @staticmethod
-    def verify_auth_token(token):
+    def decode_auth_token(token):
         try:
-            data = jwt.decode(token,
+            return jwt.decode(token,
                               current_app.config['SECRET_KEY'],
                               leeway=datetime.timedelta(seconds=10),
                               algorithms=["HS256"])
-
         except:
             return None
 
+    @staticmethod
+    def verify_auth_token(token):
+        data = User.decode_auth_token(token)
+        if data is None:
+            return None
         return User.query.get(data.get('id'))
 
+    @staticmethod
+    def on_changed(mapper, connection, target):
+        attrs = db.inspect(target).attrs
+        if any(attrs[name].history.has_changes()
+               for name in identity.user_columns):
+            identity.forget_user(target)
+
+    @staticmethod
+    def on_deleted(mapper, connection, target):
+        identity.forget_user(target)
+
+    @staticmethod
+    def recount():
+        users = User.__table__
+        posts = Post.__table__
+        comments = Comment.__table__
+        follows = Follow.__table__
+
+        def count(column):
+            return db.select(db.func.count()).where(column == users.c.id)\
+                .scalar_subquery()
+
+        db.session.execute(users.update().values(
+            post_count=count(posts.c.author_id),
+            comment_count=count(comments.c.author_id),
+            follower_count=count(follows.c.followed_id),
+            followed_count=count(follows.c.follower_id)))
+        db.session.commit()
+
+
+db.event.listen(User, 'after_update', User.on_changed)
+db.event.listen(User, 'after_delete', User.on_deleted)
+db.event.listen(db.Model.metadata, 'after_create',
+                lambda *args, **kwargs: identity.clear())
+db.event.listen(db.Model.metadata, 'after_drop',
+                lambda *args, **kwargs: identity.clear())
+
 
 class Post(db.Model):
     __tablename__ = 'posts'
@@ -264,39 +391,42 @@ class Post(db.Model):
     timestamp = db.Column(db.DateTime(), index=True,
                           default=datetime.datetime.utcnow)
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    comment_count = db.Column(db.Integer, default=0, server_default='0')
+    version = db.Column(db.Integer, default=1, server_default='1')
     comments = db.relationship('Comment', backref='post', lazy='dynamic')
+    __table_args__ = (
+        db.Index('ix_posts_author_id_timestamp', 'author_id', 'timestamp'),
+    )
+
+    allowed_tags = ['a', 'abbr', 'acronym', 'b', 'blockquote', 'code',
+                    'em', 'i', 'li', 'ol', 'pre', 'strong', 'ul',
+                    'h1', 'h2', 'h3', 'p']
 
     @staticmethod
     def on_changed_body(target, value, oldvalue, initiator):
-        allowed_tags = ['a', 'abbr', 'acronym', 'b', 'blockquote', 'code',
-                        'em', 'i', 'li', 'ol', 'pre', 'strong', 'ul',
-                        'h1', 'h2', 'h3', 'p']
-        target.body_html = bleach.linkify(bleach.clean(
-            markdown(value, output_format='html'),
-            tags=allowed_tags, strip=True))
-
-    def to_json(self):
-        json_post = {
-            'url': url_for('api.get_post', id=self.id),
-            'body': self.body,
-            'body_html': self.body_html,
-            'timestamp': self.timestamp,
-            'author_url': url_for('api.get_user', id=self.author_id),
-            'comments_url': url_for('api.get_post_comments', id=self.id),
-            'comment_count': self.comments.count()
-        }
-        return json_post
+        target.body_html = render_markdown(value, Post.allowed_tags)
 
-    def to_json(self):
-        json_post = {
-            'url': url_for('api.get_post', id=self.id),
-            'body': self.body,
-            'body_html': self.body_html,
-            'timestamp': self.timestamp,
-            'author_url': url_for('api.get_user', id=self.author_id),
-            'comments_url': url_for('api.get_post_comments', id=self.id),
-            'comment_count': self.comments.count()
-        }
+    @property
+    def etag_key(self):
+        return ('post', self.id, self.version, self.comment_count)
+
+    json_fields = {
+        'id': lambda post: post.id,
+        'url': lambda post: urls.build('api.get_post', id=post.id),
+        'body': lambda post: post.body,
+        'body_html': lambda post: post.body_html,
+        'timestamp': lambda post: post.timestamp,
+        'author_url': lambda post: urls.build('api.get_user',
+                                              id=post.author_id),
+        'comments_url': lambda post: urls.build('api.get_post_comments',
+                                                id=post.id),
+        'comment_count': lambda post: post.comment_count
+    }
+
+    def to_json(self, fields=None, expand=None):
+        json_post = serialize(self, fields)
+        if expand and 'author' in expand:
+            json_post['author'] = self.author.to_json(expand['author'])
         return json_post
 
     @staticmethod
@@ -304,10 +434,48 @@ class Post(db.Model):
         body = json_post.get('body')
         if body is None or body == '':
             raise ValidationError('post does not have a body')
+        if not isinstance(body, str):
+            raise ValidationError('post body must be a string')
         return Post(body=body)
 
+    @staticmethod
+    def on_inserted(mapper, connection, target):
+        increment(connection, User, target.author_id, post_count=1)
+        RowCount.increment(connection, 'posts', 1)
+        Timeline.fan_out(connection, target)
+        Change.record(connection, target, 'created')
+
+    @staticmethod
+    def on_updated(mapper, connection, target):
+        if changed_columns(target):
+            Change.record(connection, target, 'updated')
+
+    @staticmethod
+    def on_deleting(mapper, connection, target):
+        Timeline.remove_post(connection, target)
+
+    @staticmethod
+    def on_deleted(mapper, connection, target):
+        increment(connection, User, target.author_id, post_count=-1)
+        RowCount.increment(connection, 'posts', -1)
+        Change.record(connection, target, 'deleted')
+
+    @staticmethod
+    def recount():
+        posts = Post.__table__
+        comments = Comment.__table__
+        db.session.execute(posts.update().values(
+            comment_count=db.select(db.func.count())
+            .where(comments.c.post_id == posts.c.id).scalar_subquery()))
+        db.session.commit()
+
 
 db.event.listen(Post.body, 'set', Post.on_changed_body)
+db.event.listen(Post, 'after_insert', Post.on_inserted)
+db.event.listen(Post, 'after_update', Post.on_updated)
+db.event.listen(Post, 'before_delete', Post.on_deleting)
+db.event.listen(Post, 'after_delete', Post.on_deleted)
+db.event.listen(Post, 'before_update', bump_version)
 
 
 class Comment(db.Model):
@@ -318,26 +486,42 @@ class Comment(db.Model):
     timestamp = db.Column(db.DateTime, index=True,
                           default=datetime.datetime.utcnow)
     disabled = db.Column(db.Boolean)
+    version = db.Column(db.Integer, default=1, server_default='1')
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     post_id = db.Column(db.Integer, db.ForeignKey('posts.id'))
+    __table_args__ = (
+        db.Index('ix_comments_post_id_timestamp', 'post_id', 'timestamp'),
+        db.Index('ix_comments_disabled_timestamp', 'disabled', 'timestamp',
+                 postgresql_where=db.text('disabled')),
+    )
+
+    allowed_tags = ['a', 'abbr', 'acronym', 'b', 'code', 'em', 'i',
+                    'strong']
 
     @staticmethod
     def on_changed_body(target, value, oldvalue, initiator):
-        allowed_tags = ['a', 'abbr', 'acronym', 'b', 'code', 'em', 'i',
-                        'strong']
-        target.body_html = bleach.linkify(bleach.clean(
-            markdown(value, output_format='html'),
-            tags=allowed_tags, strip=True))
-
-    def to_json(self):
-        json_comment = {
-            'url': url_for('api.get_comment', id=self.id),
-            'post_url': url_for('api.get_post', id=self.post_id),
-            'body': self.body,
-            'body_html': self.body_html,
-            'timestamp': self.timestamp,
-            'author_url': url_for('api.get_user', id=self.author_id),
-        }
+        target.body_html = render_markdown(value, Comment.allowed_tags)
+
+    @property
+    def etag_key(self):
+        return ('comment', self.id, self.version)
+
+    json_fields = {
+        'id': lambda comment: comment.id,
+        'url': lambda comment: urls.build('api.get_comment', id=comment.id),
+        'post_url': lambda comment: urls.build('api.get_post',
+                                               id=comment.post_id),
+        'body': lambda comment: comment.body,
+        'body_html': lambda comment: comment.body_html,
+        'timestamp': lambda comment: comment.timestamp,
+        'author_url': lambda comment: urls.build('api.get_user',
+                                                 id=comment.author_id),
+    }
+
+    def to_json(self, fields=None, expand=None):
+        json_comment = serialize(self, fields)
+        if expand and 'author' in expand:
+            json_comment['author'] = self.author.to_json(expand['author'])
         return json_comment
 
     @staticmethod
@@ -345,10 +529,323 @@ class Comment(db.Model):
         body = json_comment.get('body')
         if body is None or body == '':
             raise ValidationError('comment does not have a body')
+        if not isinstance(body, str):
+            raise ValidationError('comment body must be a string')
         return Comment(body=body)
 
+    @staticmethod
+    def on_inserted(mapper, connection, target):
+        increment(connection, Post, target.post_id, comment_count=1)
+        increment(connection, User, target.author_id, comment_count=1)
+        RowCount.increment(connection, 'comments', 1)
+        Change.record(connection, target, 'created')
+
+    @staticmethod
+    def on_updated(mapper, connection, target):
+        changed = changed_columns(target)
+        if changed:
+            Change.record(connection, target,
+                          'moderated' if 'disabled' in changed else 'updated')
+
+    @staticmethod
+    def on_deleted(mapper, connection, target):
+        increment(connection, Post, target.post_id, comment_count=-1)
+        increment(connection, User, target.author_id, comment_count=-1)
+        RowCount.increment(connection, 'comments', -1)
+        Change.record(connection, target, 'deleted')
+
 
 db.event.listen(Comment.body, 'set', Comment.on_changed_body)
+db.event.listen(Comment, 'after_insert', Comment.on_inserted)
+db.event.listen(Comment, 'after_update', Comment.on_updated)
+db.event.listen(Comment, 'after_delete', Comment.on_deleted)
+db.event.listen(Comment, 'before_update', bump_version)
+
+
+class RowCount(db.Model):
+    __tablename__ = 'row_counts'
+    table_name = db.Column(db.String(64), primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+
+    @staticmethod
+    def increment(connection, table_name, delta):
+        if connection.dialect.name != 'sqlite':
+            return
+        row_counts = RowCount.__table__
+        connection.execute(row_counts.update()
+                           .where(row_counts.c.table_name == table_name)
+                           .values(count=row_counts.c.count + delta))
+
+    @staticmethod
+    def get(table_name):
+        """Return the maintained row count of ``table_name``.
+
+        A missing counter is initialized from an exact count on a
+        connection of its own, so the caller's transaction is neither
+        committed nor rolled back.
+        """
+        row_counts = RowCount.__table__
+        with db.session.no_autoflush:
+            count = db.session.scalar(db.select(row_counts.c.count).where(
+                row_counts.c.table_name == table_name))
+        if count is None:
+            table = db.metadata.tables[table_name]
+            try:
+                with db.engine.begin() as connection:
+                    count = connection.scalar(
+                        db.select(db.func.count()).select_from(table))
+                    connection.execute(row_counts.insert().values(
+                        table_name=table_name, count=count))
+            except IntegrityError:
+                return RowCount.get(table_name)
+        return count
+
+    @staticmethod
+    def recount():
+        """Reset every maintained counter to an exact count.
+
+        A counter initialized while another transaction's insert or delete
+        was uncommitted misses that change for good; this repairs it.
+        """
+        row_counts = RowCount.__table__
+        for table_name in db.session.scalars(
+                db.select(row_counts.c.table_name)).all():
+            table = db.metadata.tables[table_name]
+            db.session.execute(
+                row_counts.update()
+                .where(row_counts.c.table_name == table_name)
+                .values(count=db.select(db.func.count()).select_from(table)
+                        .scalar_subquery()))
+        db.session.commit()
+
+
+class Timeline(db.Model):
+    __tablename__ = 'timelines'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'),
+                        primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id'),
+                        primary_key=True)
+    timestamp = db.Column(db.DateTime)
+    __table_args__ = (
+        db.Index('ix_timelines_user_id_timestamp_post_id',
+                 'user_id', 'timestamp', 'post_id'),
+    )
+
+    @staticmethod
+    def length():
+        return current_app.config['FLASKY_TIMELINE_LENGTH']
+
+    @staticmethod
+    def fan_out(connection, post):
+        timelines = Timeline.__table__
+        follows = Follow.__table__
+        posts = Post.__table__
+        followers = db.select(follows.c.follower_id, posts.c.id,
+                              posts.c.timestamp)\
+            .where(posts.c.id == post.id)\
+            .where(follows.c.followed_id == posts.c.author_id)
+        connection.execute(timelines.insert().from_select(
+            ['user_id', 'post_id', 'timestamp'], followers))
+
+    @staticmethod
+    def remove_post(connection, post):
+        timelines = Timeline.__table__
+        connection.execute(timelines.delete().where(
+            timelines.c.post_id == post.id))
+
+    @staticmethod
+    def backfill(connection, follower_id, followed_id):
+        timelines = Timeline.__table__
+        posts = Post.__table__
+        recent = db.select(db.literal(follower_id), posts.c.id,
+                           posts.c.timestamp)\
+            .where(posts.c.author_id == followed_id)\
+            .order_by(posts.c.timestamp.desc(), posts.c.id.desc())\
+            .limit(Timeline.length())
+        connection.execute(timelines.insert().from_select(
+            ['user_id', 'post_id', 'timestamp'], recent))
+        Timeline.trim(connection, follower_id)
+
+    @staticmethod
+    def prune(connection, follower_id, followed_id):
+        timelines = Timeline.__table__
+        posts = Post.__table__
+        connection.execute(timelines.delete()
+                           .where(timelines.c.user_id == follower_id)
+                           .where(timelines.c.post_id.in_(
+                               db.select(posts.c.id).where(
+                                   posts.c.author_id == followed_id))))
+
+    @staticmethod
+    def trim(connection, user_id):
+        """Drop all but the newest ``length()`` rows of one timeline.
+
+        The cutoff is found by seeking the timeline index, so the cost is
+        bounded by the timeline length rather than the table size.
+        """
+        timelines = Timeline.__table__
+        cutoff = connection.execute(
+            db.select(timelines.c.timestamp, timelines.c.post_id)
+            .where(timelines.c.user_id == user_id)
+            .order_by(timelines.c.timestamp.desc(),
+                      timelines.c.post_id.desc())
+            .offset(Timeline.length() - 1).limit(1)).first()
+        if cutoff is not None:
+            connection.execute(
+                timelines.delete()
+                .where(timelines.c.user_id == user_id)
+                .where(db.tuple_(timelines.c.timestamp, timelines.c.post_id)
+                       < tuple(cutoff)))
+
+    @staticmethod
+    def trim_all():
+        """Trim every timeline that has grown past ``length()``.
+
+        Posting only appends to followers' timelines; this is meant to
+        run periodically, e.g. from cron via ``flask trim-timelines``.
+        """
+        timelines = Timeline.__table__
+        connection = db.session.connection()
+        over = connection.execute(
+            db.select(timelines.c.user_id).group_by(timelines.c.user_id)
+            .having(db.func.count() > Timeline.length())).scalars().all()
+        for user_id in over:
+            Timeline.trim(connection, user_id)
+        db.session.commit()
+        return len(over)
+
+    @staticmethod
+    def rebuild():
+        connection = db.session.connection()
+        connection.execute(Timeline.__table__.delete())
+        for follow in Follow.query.all():
+            Timeline.backfill(connection, follow.follower_id,
+                              follow.followed_id)
+        db.session.commit()
+
+
+class OutboxMessage(db.Model):
+    __tablename__ = 'outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    sender = db.Column(db.String(128))
+    recipient = db.Column(db.String(64), nullable=False)
+    subject = db.Column(db.String(256), nullable=False)
+    body = db.Column(db.Text)
+    html = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt = db.Column(db.DateTime, index=True,
+                             default=datetime.datetime.utcnow)
+    claim = db.Column(db.String(32), index=True)
+    last_error = db.Column(db.Text)
+    timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+
+change_sequence = db.Table(
+    'change_sequence',
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('value', db.Integer, nullable=False))
+
+db.event.listen(change_sequence, 'after_create', lambda target, connection,
+                **kwargs: connection.execute(
+                    target.insert().values(id=1, value=0)))
+
+
+class Change(db.Model):
+    """One row per created, updated, moderated or deleted post or comment.
+
+    Rows are written in the same transaction as the change itself, with
+    no ``sequence`` yet. Just before that transaction commits the rows get
+    their sequences in one batched UPDATE, under the lock of the one
+    ``change_sequence`` row, which is then held only until the commit
+    completes. Sequences thus become visible in order and without gaps: a
+    reader can never see a change whose sequence is above one still in
+    flight.
+    """
+    __tablename__ = 'changes'
+    id = db.Column(db.Integer, primary_key=True)
+    sequence = db.Column(db.Integer, index=True, unique=True)
+    resource = db.Column(db.String(16), nullable=False)
+    resource_id = db.Column(db.Integer, nullable=False)
+    operation = db.Column(db.String(16), nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_changes_resource_resource_id_sequence',
+                 'resource', 'resource_id', 'sequence'),
+    )
+
+    resources = {'posts': 'post', 'comments': 'comment'}
+    endpoints = {'post': 'api.get_post', 'comment': 'api.get_comment'}
+
+    @staticmethod
+    def record(connection, target, operation):
+        result = connection.execute(Change.__table__.insert().values(
+            resource=Change.resources[target.__tablename__],
+            resource_id=target.id, operation=operation,
+            timestamp=datetime.datetime.utcnow()))
+        object_session(target).info.setdefault('changes_recorded', []).append(
+            result.inserted_primary_key[0])
+
+    @staticmethod
+    def assign_sequences(session):
+        """Number the changes of the committing transaction."""
+        # do the flush the commit would do next, recording its changes
+        session.flush()
+        ids = session.info.pop('changes_recorded', None)
+        if not ids:
+            return
+        session.execute(change_sequence.update().values(
+            value=change_sequence.c.value + len(ids)))
+        first = session.scalar(db.select(change_sequence.c.value)) - len(ids)
+        changes = Change.__table__
+        session.execute(
+            changes.update().where(changes.c.id == db.bindparam('change_id'))
+            .values(sequence=db.bindparam('change_sequence')),
+            [{'change_id': id, 'change_sequence': first + position}
+             for position, id in enumerate(ids, 1)])
+
+    @staticmethod
+    def on_rollback(session):
+        session.info.pop('changes_recorded', None)
+
+    @staticmethod
+    def compact():
+        """Delete every change superseded by a later one for its item.
+
+        The table then holds one row per post or comment ever written, and
+        a client resuming from any cursor still receives the latest state
+        of everything that changed after it.
+        """
+        changes = Change.__table__
+        newer = changes.alias()
+        latest = db.select(db.func.max(newer.c.sequence))\
+            .where(newer.c.resource == changes.c.resource)\
+            .where(newer.c.resource_id == changes.c.resource_id)\
+            .scalar_subquery()
+        result = db.session.execute(
+            changes.delete().where(changes.c.sequence < latest))
+        db.session.commit()
+        return result.rowcount
+
+    def to_json(self, item=None):
+        json_change = {
+            'sequence': self.sequence,
+            'type': self.resource,
+            'id': self.resource_id,
+            'operation': self.operation,
+            'timestamp': self.timestamp,
+            'url': urls.build(Change.endpoints[self.resource],
+                              id=self.resource_id),
+            'item': item
+        }
+        return json_change
+
+
+db.event.listen(db.session, 'before_commit', Change.assign_sequences)
+db.event.listen(db.session, 'after_rollback', Change.on_rollback)
+
+
+def with_authors(model):
+    return db.selectinload(model.author).joinedload(User.role)
 
 
 class AnonymousUser(AnonymousUserMixin):
@@ -364,4 +861,4 @@ login_manager.anonymous_user = AnonymousUser
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return identity.get_user(int(user_id))
@@ -0,0 +1,90 @@
+import atexit
+import threading
+from flask import current_app
+from sqlalchemy import bindparam
+from . import db
+from .cache import LRUCache
+
+
+class LastSeenBuffer:
+    """Coalesce ``last_seen`` updates and write them in bulk.
+
+    A user is recorded at most once per ``FLASKY_LAST_SEEN_RESOLUTION``
+    seconds per process. Recorded times are written with a single
+    executemany UPDATE every ``FLASKY_LAST_SEEN_FLUSH_INTERVAL`` seconds,
+    or immediately when the interval is 0, and at interpreter exit.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.pending = {}
+        self.recent = LRUCache('last_seen', maxsize=65536)
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def record(self, user_id, when):
+        config = current_app.config
+        if self.recent.get(user_id) is not None:
+            return False
+        self.recent.set(user_id, when,
+                        ttl=config['FLASKY_LAST_SEEN_RESOLUTION'])
+        with self._lock:
+            self.pending[user_id] = when
+            self.app = current_app._get_current_object()
+        interval = config['FLASKY_LAST_SEEN_FLUSH_INTERVAL']
+        if interval:
+            self.schedule(interval)
+        else:
+            self.flush()
+        return True
+
+    def schedule(self, interval):
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(interval, self.flush_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush_in_background(self):
+        with self._lock:
+            self._timer = None
+            app = self.app
+        with app.app_context():
+            try:
+                self.flush()
+            except Exception:
+                app.logger.exception('Could not write last_seen updates')
+
+    def flush(self):
+        with self._lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return 0
+        from .models import User
+        from .api.response_cache import touch
+        users = User.__table__
+        try:
+            db.session.execute(
+                users.update().where(users.c.id == bindparam('user_id'))
+                .values(last_seen=bindparam('seen')),
+                [{'user_id': user_id, 'seen': seen}
+                 for user_id, seen in pending.items()])
+            touch(User, *pending)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            with self._lock:
+                for user_id, seen in pending.items():
+                    self.pending.setdefault(user_id, seen)
+            raise
+        return len(pending)
+
+    def shutdown(self):
+        if self.app is not None and self.pending:
+            with self.app.app_context():
+                self.flush()
+
+
+last_seen_buffer = LastSeenBuffer()
+atexit.register(last_seen_buffer.shutdown)
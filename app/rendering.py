@@ -0,0 +1,138 @@
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import bleach
+from flask import current_app
+from markdown import markdown
+from sqlalchemy.dialects import postgresql, sqlite
+from . import db
+from .cache import LRUCache
+
+rendered_bodies = db.Table(
+    'rendered_bodies',
+    db.Column('hash', db.String(64), primary_key=True),
+    db.Column('html', db.Text, nullable=False))
+
+
+class RenderCache(LRUCache):
+    persisted_hits = 0
+
+    def persisted_hit(self, key, html):
+        """Count a hit served from ``rendered_bodies`` and keep it here."""
+        with self._lock:
+            self.persisted_hits += 1
+        self.set(key, html)
+
+    def stats(self):
+        stats = super().stats()
+        stats['persisted_hits'] = self.persisted_hits
+        return stats
+
+
+render_cache = RenderCache('render')
+pool = None
+
+
+def cache_key(body, tags):
+    digest = hashlib.sha256(body.encode('utf-8'))
+    digest.update(b'\0' + ','.join(tags).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def render(body, tags):
+    return bleach.linkify(bleach.clean(
+        markdown(body, output_format='html'), tags=tags, strip=True))
+
+
+def load_persisted(key):
+    with db.session.no_autoflush:
+        return db.session.scalar(db.select(rendered_bodies.c.html).where(
+            rendered_bodies.c.hash == key))
+
+
+def persist(key, html):
+    dialects = {'postgresql': postgresql, 'sqlite': sqlite}
+    dialect = dialects.get(db.engine.dialect.name)
+    if dialect is None:
+        return
+    with db.session.no_autoflush:
+        db.session.execute(dialect.insert(rendered_bodies)
+                           .values(hash=key, html=html)
+                           .on_conflict_do_nothing())
+
+
+def get_pool():
+    global pool
+    workers = current_app.config['FLASKY_RENDER_POOL_WORKERS']
+    if not workers:
+        return None
+    if pool is None:
+        pool = ProcessPoolExecutor(max_workers=workers)
+    return pool
+
+
+def render_all(bodies, tags):
+    global pool
+    config = current_app.config
+    executor = None
+    if len(bodies) >= config['FLASKY_RENDER_POOL_BATCH'] or \
+            max(map(len, bodies)) >= config['FLASKY_RENDER_POOL_THRESHOLD']:
+        executor = get_pool()
+    if executor is not None:
+        try:
+            return list(executor.map(render, bodies, [tags] * len(bodies)))
+        except (BrokenProcessPool, OSError) as e:
+            # reap the surviving workers instead of leaking them with the
+            # executor, and only drop the pool if no one replaced it yet
+            executor.shutdown(wait=False)
+            if pool is executor:
+                pool = None
+            current_app.logger.warning(
+                f'Render pool failed, rendering synchronously: {e!r}')
+    return [render(body, tags) for body in bodies]
+
+
+def lookup(key):
+    render_cache.maxsize = current_app.config['FLASKY_RENDER_CACHE_SIZE']
+    html = render_cache.get(key)
+    if html is None and current_app.config['FLASKY_RENDER_CACHE_PERSIST']:
+        html = load_persisted(key)
+        if html is not None:
+            render_cache.persisted_hit(key, html)
+    return html
+
+
+def store(key, html):
+    render_cache.set(key, html)
+    if current_app.config['FLASKY_RENDER_CACHE_PERSIST']:
+        persist(key, html)
+
+
+def render_many(bodies, tags):
+    """Render ``bodies`` to sanitized HTML, reusing earlier results.
+
+    Results are kept in a per-process LRU keyed by a hash of the body and
+    the tag whitelist, and optionally in the ``rendered_bodies`` table.
+    Cache misses are rendered in a process pool when the batch is large
+    enough or a body is long, and synchronously otherwise.
+    """
+    keys = [cache_key(body, tags) for body in bodies]
+    results = {}
+    missing = {}
+    for key, body in zip(keys, bodies):
+        if key not in results and key not in missing:
+            html = lookup(key)
+            if html is None:
+                missing[key] = body
+            else:
+                results[key] = html
+    if missing:
+        rendered = render_all(list(missing.values()), tags)
+        for key, html in zip(missing, rendered):
+            store(key, html)
+            results[key] = html
+    return [results[key] for key in keys]
+
+
+def render_markdown(body, tags):
+    return render_many([body], tags)[0]
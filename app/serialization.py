@@ -0,0 +1,99 @@
+import datetime
+import json
+import time
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj, default, sort_keys=True, indent=False):
+    """Serialize ``obj`` to UTF-8 JSON bytes, with orjson when available.
+
+    Datetimes are passed through to ``default`` so they keep Flask's
+    HTTP date format. Values orjson rejects fall back to :mod:`json`.
+    """
+    if orjson is not None:
+        option = orjson.OPT_PASSTHROUGH_DATETIME
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=default, option=option)
+        except TypeError:
+            pass
+    return json.dumps(obj, default=default, sort_keys=sort_keys,
+                      ensure_ascii=False, indent=2 if indent else None,
+                      separators=None if indent else (',', ':')
+                      ).encode('utf-8')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    ensure_ascii = False
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj, self.default, self.sort_keys).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or \
+            (self.compact is None and self._app.debug)
+        return self._app.response_class(
+            dumps(obj, self.default, self.sort_keys, indent) + b'\n',
+            mimetype=self.mimetype)
+
+
+def sample_posts(count):
+    from .models import Post
+    now = datetime.datetime.utcnow()
+    return [Post(id=i + 1, author_id=1, comment_count=i % 7, timestamp=now,
+                 body=f'Post number {i} with *some* markdown.')
+            for i in range(count)]
+
+
+def timed(encode, rounds):
+    start = time.perf_counter()
+    for i in range(rounds):
+        encode()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def page_timings(sizes, rounds, providers):
+    """Time one API page of posts with each of ``providers``.
+
+    Must run inside a request context. Yields ``(size, name, ms)``.
+    """
+    def envelope(posts):
+        return {'posts': [post.to_json() for post in posts],
+                'prev': None, 'next': None, 'count': len(posts)}
+
+    for size in sizes:
+        posts = sample_posts(size)
+        for name, provider in providers:
+            yield size, name, timed(
+                lambda: provider.response(envelope(posts)).get_data(), rounds)
+
+
+def json_page_timings(config_name, sizes=(20, 100), rounds=200):
+    """Time one API page of posts under each serialization path.
+
+    Each URL building mode runs in its own app created from
+    ``config_name``. Yields ``(size, path, ms)``.
+    """
+    from . import create_app
+    for url_templates in (False, True):
+        app = create_app(config_name)
+        app.config['FLASKY_URL_TEMPLATES'] = url_templates
+        with app.test_request_context():
+            default = DefaultJSONProvider(app)
+            if url_templates:
+                providers = [('json + url templates', default),
+                             ('fast provider + url templates', app.json)]
+            else:
+                providers = [('json + url_for', default)]
+            yield from page_timings(sizes, rounds, providers)
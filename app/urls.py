@@ -0,0 +1,39 @@
+import re
+from flask import current_app, has_request_context, request, url_for
+
+placeholder = re.compile(r'<(?:[^:<>]+:)?([^<>]+)>')
+
+
+def template(endpoint):
+    """Return a ``str.format`` template for ``endpoint``'s only rule.
+
+    Endpoints with several rules, defaults or host matching get ``None``
+    and are always built with ``url_for``.
+    """
+    templates = current_app.extensions.setdefault('url_templates', {})
+    if endpoint not in templates:
+        rules = list(current_app.url_map.iter_rules(endpoint))
+        rule = rules[0] if len(rules) == 1 else None
+        if rule is None or rule.defaults or rule.subdomain or rule.host:
+            templates[endpoint] = None
+        else:
+            templates[endpoint] = (placeholder.sub(r'{\1}', rule.rule),
+                                   frozenset(rule.arguments))
+    return templates[endpoint]
+
+
+def build(endpoint, **values):
+    """Build the URL of an integer-keyed route without walking the map.
+
+    Equivalent to ``url_for(endpoint, **values)`` for the ``api.*``
+    routes used in serialization; anything else falls back to it, as do
+    all endpoints when ``FLASKY_URL_TEMPLATES`` is off.
+    """
+    compiled = None
+    if current_app.config['FLASKY_URL_TEMPLATES']:
+        compiled = template(endpoint)
+    if compiled is None or not has_request_context() or \
+            values.keys() != compiled[1] or \
+            not all(type(value) is int for value in values.values()):
+        return url_for(endpoint, **values)
+    return request.script_root + compiled[0].format(**values)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 
@@ -15,9 +16,60 @@ class Config:
 
     FLASKY_MAIL_SUBJECT_PREFIX = '[Flasky]'
     FLASKY_MAIL_SENDER = 'Flasky Admin <flasky@example.com>'
+    FLASKY_MAIL_WORKER = True
+    FLASKY_MAIL_POLL_INTERVAL = 60
+    FLASKY_MAIL_BATCH_SIZE = 50
+    FLASKY_MAIL_LEASE = 300
+    FLASKY_MAIL_RETRY_DELAY = 30
+    FLASKY_MAIL_MAX_ATTEMPTS = 8
     FLASKY_POSTS_PER_PAGE = 20
     FLASKY_FOLLOWERS_PER_PAGE = 50
     FLASKY_COMMENTS_PER_PAGE = 30
+    FLASKY_TIMELINE_LENGTH = 1000
+    FLASKY_COUNT_STRATEGY = 'exact'
+    FLASKY_COUNT_STRATEGIES = {}
+    FLASKY_COUNT_CACHE_TTL = 60
+    FLASKY_RENDER_CACHE_SIZE = 1024
+    FLASKY_RENDER_CACHE_PERSIST = False
+    FLASKY_RENDER_POOL_WORKERS = 2
+    FLASKY_RENDER_POOL_THRESHOLD = 16 * 1024
+    FLASKY_RENDER_POOL_BATCH = 16
+    FLASKY_FRAGMENT_CACHE_TTL = 300
+    FLASKY_TOKEN_CACHE_SIZE = 4096
+    FLASKY_TOKEN_CACHE_TTL = 300
+    FLASKY_CREDENTIALS_CACHE_SIZE = 1024
+    FLASKY_CREDENTIALS_CACHE_TTL = 60
+    FLASKY_API_ISSUED_TOKEN_EXPIRATION = 3600
+    FLASKY_LAST_SEEN_RESOLUTION = 60
+    FLASKY_LAST_SEEN_FLUSH_INTERVAL = 15
+    FLASKY_IDENTITY_CACHE_TTL = 300
+    FLASKY_IDENTITY_STAMP = os.environ.get('FLASKY_IDENTITY_STAMP') or \
+        os.path.join(tempfile.gettempdir(), 'flasky-identity-stamp')
+    FLASKY_RATE_LIMITS = {
+        'default': {'user': (300, 60), 'ip': (600, 60)},
+        'api.get_user_followed_posts': {'user': (30, 60), 'ip': (60, 60)},
+    }
+    FLASKY_RATE_LIMIT_STORAGE = \
+        os.environ.get('FLASKY_RATE_LIMIT_STORAGE') or 'memory://'
+    FLASKY_API_BATCH_SIZE = 100
+    FLASKY_EXPORT_CHUNK_SIZE = 1000
+    FLASKY_URL_TEMPLATES = True
+    FLASKY_CHANGES_PER_PAGE = 100
+    FLASKY_RESPONSE_CACHE_SIZE = 4096
+    FLASKY_RESPONSE_CACHE_TTL = 300
+    FLASKY_RESPONSE_CACHE_STORAGE = \
+        os.environ.get('FLASKY_RESPONSE_CACHE_STORAGE') or 'memory://'
+    FLASKY_COMPRESS_MIN_SIZE = 500
+    FLASKY_COMPRESS_LEVEL = 6
+    FLASKY_COMPRESS_MIMETYPES = [
+        'text/html', 'text/css', 'text/plain', 'text/javascript',
+        'application/javascript', 'application/json', 'application/xml',
+        'application/x-ndjson', 'image/svg+xml']
+    FLASKY_PAGE_CACHE_TTL = {
+        'main.index': 30,
+        'main.user': 60,
+        'main.post': 60,
+    }
 
     SQLALCHEMY_RECORD_QUERIES = True
     FLASKY_SLOW_DB_QUERY_TIME = 0.5
@@ -40,6 +92,12 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or \
         'sqlite://'
     WTF_CSRF_ENABLED = False
+    FLASKY_RENDER_POOL_WORKERS = 0
+    FLASKY_PAGE_CACHE_TTL = {}
+    FLASKY_LAST_SEEN_FLUSH_INTERVAL = 0
+    FLASKY_IDENTITY_STAMP = None
+    FLASKY_MAIL_WORKER = False
+    FLASKY_RATE_LIMITS = {}
 
 
 class ProductionConfig(Config):
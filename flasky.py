@@ -4,7 +4,7 @@ import click
 from flask_migrate import Migrate, upgrade  # nopep8
 from dotenv import load_dotenv
 from app import create_app, db  # nopep8
-from app.models import User, Role, Permission, Post, Comment  # nopep8
+from app.models import User, Role, Permission, Post, Comment, RowCount, Timeline  # nopep8
 
 
 dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
@@ -57,3 +57,81 @@ def deploy():
 
     # create or update user roles
     Role.insert_roles()
+
+
+@app.cli.command()
+def rebuild_timelines():
+    """Rebuild the materialized home timelines."""
+    Timeline.rebuild()
+
+
+@app.cli.command()
+def trim_timelines():
+    """Trim home timelines that have grown past their length."""
+    click.echo(f'Trimmed {Timeline.trim_all()} timelines')
+
+
+@app.cli.command()
+def compact_changes():
+    """Drop change feed entries superseded by later ones."""
+    from app.models import Change
+    click.echo(f'Removed {Change.compact()} superseded changes')
+
+
+@app.cli.command()
+def recount():
+    """Recompute the denormalized post, comment, follow and row counters."""
+    User.recount()
+    Post.recount()
+    RowCount.recount()
+
+
+@app.cli.command()
+def explain():
+    """Show the query plans of the hot endpoint queries."""
+    from app.explain import hot_queries, query_plan, is_sequential_scan
+    for endpoint, query in hot_queries():
+        click.echo(endpoint)
+        for step in query_plan(query):
+            flag = 'SEQUENTIAL SCAN ' if is_sequential_scan(step) else ''
+            click.echo(f'    {flag}{step}')
+
+
+@app.cli.command()
+def drain_outbox():
+    """Deliver every queued email that is due."""
+    from app.email import deliver_pending
+    attempted = 0
+    while True:
+        batch = deliver_pending()
+        if not batch:
+            break
+        attempted += batch
+    click.echo(f'Attempted {attempted} queued emails.')
+
+
+@app.cli.command()
+@click.option('--rounds', default=200, help='Pages encoded per timing.')
+def benchmark_json(rounds):
+    """Time API page serialization on 20- and 100-item pages."""
+    from app.serialization import json_page_timings
+    timings = json_page_timings(os.getenv('FLASK_CONFIG') or 'default',
+                                rounds=rounds)
+    for size, path, ms in sorted(timings, key=lambda timing: timing[0]):
+        click.echo(f'{size:4d} items  {path:32s} {ms:8.3f} ms/page')
+
+
+@app.cli.command()
+@click.argument('table', type=click.Choice(['posts', 'comments', 'users']))
+@click.option('--output', '-o', type=click.File('wb'), default='-',
+              help='File to write to, standard output by default.')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+def export(table, output, compress):
+    """Export a table as newline-delimited JSON."""
+    from app.export import export_lines, gzipped, tables
+    with app.test_request_context():
+        lines = export_lines(tables[table])
+        if compress:
+            lines = gzipped(lines)
+        for chunk in lines:
+            output.write(chunk)
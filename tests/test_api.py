@@ -1,8 +1,13 @@
+import gzip
 import json
+import os
+import tempfile
 import unittest
 from base64 import b64encode
+from flask_sqlalchemy import get_debug_queries
 from app import create_app, db
-from app.models import Post, Role, User, Comment
+from app.export import export_lines
+from app.models import Change, Post, Role, User, Comment
 
 
 class ApiTestCase(unittest.TestCase):
@@ -247,3 +252,512 @@ class ApiTestCase(unittest.TestCase):
         data = response.get_json()
 
         self.assertEqual(len(data['comments']), 2)
+
+    def test_cursor_pagination(self):
+        r = Role.query.filter_by(name="User").first()
+        u = User(username="ayoub", email='ay@ex.com',
+                 password="ayoub2022", confirmed=True, role=r)
+        db.session.add(u)
+        db.session.commit()
+        posts = [Post(body=f'post {i}', author=u) for i in range(45)]
+        db.session.add_all(posts)
+        db.session.commit()
+        headers = self.get_api_headers('ay@ex.com', 'ayoub2022')
+
+        # walk forward through the cursors
+        bodies = []
+        url = '/api/v1/posts/'
+        pages = []
+        while url:
+            response = self.client.get(url, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            data = response.get_json()
+            self.assertEqual(data['count'], 45)
+            bodies += [post['body'] for post in data['posts']]
+            pages.append(data)
+            url = data['next']
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(sorted(bodies), sorted(p.body for p in posts))
+        self.assertIsNone(pages[0]['prev'])
+
+        # and back again
+        response = self.client.get(pages[2]['prev'], headers=headers)
+        self.assertEqual(response.get_json()['posts'], pages[1]['posts'])
+
+        # page numbers keep working
+        response = self.client.get('/api/v1/posts/?page=2', headers=headers)
+        data = response.get_json()
+        self.assertEqual(data['posts'], pages[1]['posts'])
+        self.assertTrue(data['next'].endswith('page=3'))
+
+        response = self.client.get('/api/v1/posts/?cursor=bogus',
+                                   headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_stats(self):
+        admin = Role.query.filter_by(name="Administrator").first()
+        user = Role.query.filter_by(name="User").first()
+        u1 = User(username="ayoub", email='ay@ex.com',
+                  password="ayoub2022", confirmed=True, role=admin)
+        u2 = User(username="morad", email='ma@ex.com',
+                  password="morad2022", confirmed=True, role=user)
+        db.session.add_all([u1, u2])
+        db.session.commit()
+
+        response = self.client.get(
+            '/api/v1/stats/', headers=self.get_api_headers('ma@ex.com', 'morad2022'))
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.get(
+            '/api/v1/stats/', headers=self.get_api_headers('ay@ex.com', 'ayoub2022'))
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertIn('hits', data['caches']['render'])
+        self.assertIn('persisted_hits', data['caches']['render'])
+
+    def test_conditional_requests(self):
+        r = Role.query.filter_by(name="User").first()
+        u = User(username="ayoub", email='ay@ex.com',
+                 password="ayoub2022", confirmed=True, role=r)
+        db.session.add(u)
+        db.session.commit()
+        headers = self.get_api_headers('ay@ex.com', 'ayoub2022')
+
+        response = self.client.post(
+            '/api/v1/posts/', headers=headers,
+            data=json.dumps({'body': 'first version'}))
+        url = response.headers.get('Location')
+
+        # unchanged post and list revalidate with 304
+
+        response = self.client.get(url, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers.get('ETag')
+        self.assertIsNotNone(etag)
+        response = self.client.get(
+            url, headers=dict(headers, **{'If-None-Match': etag}))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+        response = self.client.get('/api/v1/posts/', headers=headers)
+        list_etag = response.headers.get('ETag')
+        response = self.client.get(
+            '/api/v1/posts/',
+            headers=dict(headers, **{'If-None-Match': list_etag}))
+        self.assertEqual(response.status_code, 304)
+
+        # an edit with the current etag succeeds and changes it
+
+        response = self.client.put(
+            url, headers=dict(headers, **{'If-Match': etag}),
+            data=json.dumps({'body': 'second version'}))
+        self.assertEqual(response.status_code, 200)
+        new_etag = response.headers.get('ETag')
+        self.assertNotEqual(new_etag, etag)
+
+        response = self.client.get(
+            url, headers=dict(headers, **{'If-None-Match': etag}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['body'], 'second version')
+        response = self.client.get(
+            '/api/v1/posts/',
+            headers=dict(headers, **{'If-None-Match': list_etag}))
+        self.assertEqual(response.status_code, 200)
+
+        # a stale etag is rejected
+
+        response = self.client.put(
+            url, headers=dict(headers, **{'If-Match': etag}),
+            data=json.dumps({'body': 'lost update'}))
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(response.get_json()['error'], 'precondition failed')
+
+    def test_token_cache(self):
+        user = Role.query.filter_by(name="User").first()
+        admin = Role.query.filter_by(name="Administrator").first()
+        u = User(username="ayoub", email='ay@ex.com',
+                 password="ayoub2022", confirmed=True, role=user)
+        db.session.add(u)
+        db.session.commit()
+
+        response = self.client.post(
+            '/api/v1/tokens/', headers=self.get_api_headers('ay@ex.com', 'ayoub2022'))
+        token = response.get_json()['token']
+        headers = self.get_api_headers(token, '')
+
+        response = self.client.get('/api/v1/stats/', headers=headers)
+        self.assertEqual(response.status_code, 403)
+
+        # a cached token is served without decoding or loading the user
+
+        before = len(get_debug_queries())
+        response = self.client.get('/api/v1/stats/', headers=headers)
+        self.assertEqual(response.status_code, 403)
+        queries = get_debug_queries()[before:]
+        self.assertFalse(any('FROM users' in q.statement for q in queries))
+
+        # role and confirmation changes are picked up immediately
+
+        u.role = admin
+        db.session.commit()
+        response = self.client.get('/api/v1/stats/', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        stats = response.get_json()['caches']['tokens']
+        self.assertGreaterEqual(stats['hits'], 1)
+        self.assertGreaterEqual(stats['invalidations'], 1)
+
+        u.confirmed = False
+        db.session.commit()
+        response = self.client.get('/api/v1/stats/', headers=headers)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.get_json()['message'],
+                         'Unconfirmed account')
+
+    def test_token_cache_follows_other_workers(self):
+        admin = Role.query.filter_by(name="Administrator").first()
+        user = Role.query.filter_by(name="User").first()
+        u = User(username="ayoub", email='ay@ex.com',
+                 password="ayoub2022", confirmed=True, role=admin)
+        db.session.add(u)
+        db.session.commit()
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        self.app.config['FLASKY_IDENTITY_STAMP'] = path
+        headers = self.get_api_headers(u.generate_auth_token(3600), '')
+        response = self.client.get('/api/v1/stats/', headers=headers)
+        self.assertEqual(response.status_code, 200)
+
+        # another worker demotes the user and touches the stamp
+        db.session.execute(User.__table__.update().values(role_id=user.id))
+        db.session.commit()
+        os.utime(path, ns=(0, 0))
+        response = self.client.get('/api/v1/stats/', headers=headers)
+        self.assertEqual(response.status_code, 403)
+
+    def test_credentials_cache(self):
+        r = Role.query.filter_by(name="User").first()
+        u = User(username="ayoub", email='ay@ex.com',
+                 password="ayoub2022", confirmed=True, role=r)
+        db.session.add(u)
+        db.session.commit()
+        from app.api.authentication import credentials_cache
+        hits = credentials_cache.hits
+
+        response = self.client.get(
+            '/api/v1/posts/', headers=self.get_api_headers('ay@ex.com', 'ayoub2022'))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            '/api/v1/posts/', headers=self.get_api_headers('ay@ex.com', 'ayoub2022'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(credentials_cache.hits, hits + 1)
+
+        # a password change flushes the cached credentials
+
+        u.password = 'ayoub2023'
+        db.session.commit()
+        response = self.client.get(
+            '/api/v1/posts/', headers=self.get_api_headers('ay@ex.com', 'ayoub2022'))
+        self.assertEqual(response.status_code, 401)
+
+        # password requests are offered a token to switch to
+
+        response = self.client.get(
+            '/api/v1/posts/', headers=self.get_api_headers('ay@ex.com', 'ayoub2023'))
+        info = response.headers.get('Authentication-Info')
+        self.assertIsNotNone(info)
+        token = info.split('"')[1]
+        response = self.client.get(
+            '/api/v1/posts/', headers=self.get_api_headers(token, ''))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.headers.get('Authentication-Info'))
+
+    def test_batch_create(self):
+        r = Role.query.filter_by(name="User").first()
+        u = User(username="ayoub", email='ay@ex.com',
+                 password="ayoub2022", confirmed=True, role=r)
+        db.session.add(u)
+        db.session.commit()
+        headers = self.get_api_headers('ay@ex.com', 'ayoub2022')
+
+        response = self.client.post(
+            '/api/v1/posts/batch', headers=headers,
+            data=json.dumps([{'body': 'first *post*'}, {'body': ''},
+                             'not an object', {'body': 123},
+                             {'body': 'second post'}]))
+        self.assertEqual(response.status_code, 207)
+        data = response.get_json()
+        self.assertEqual(data['created'], 2)
+        statuses = [result['status'] for result in data['results']]
+        self.assertEqual(statuses, [201, 400, 400, 400, 201])
+        self.assertEqual(data['results'][3]['message'],
+                         'post body must be a string')
+        self.assertEqual(data['results'][0]['post']['body_html'],
+                         '<p>first <em>post</em></p>')
+        self.assertEqual(data['results'][1]['message'],
+                         'post does not have a body')
+        self.assertEqual(Post.query.count(), 2)
+        self.assertEqual(u.post_count, 2)
+
+        post_url = data['results'][0]['location']
+        response = self.client.post(
+            post_url + '/comments/batch', headers=headers,
+            data=json.dumps({'comments': [{'body': 'one'}, {'body': 'two'}]}))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Comment.query.count(), 2)
+        location = response.get_json()['results'][1]['location']
+        response = self.client.get(location, headers=headers)
+        self.assertEqual(response.get_json()['body'], 'two')
+
+        response = self.client.post(
+            '/api/v1/posts/batch', headers=headers,
+            data=json.dumps([{'body': ''}]))
+        self.assertEqual(response.status_code, 400)
+
+        self.app.config['FLASKY_API_BATCH_SIZE'] = 1
+        response = self.client.post(
+            '/api/v1/posts/batch', headers=headers,
+            data=json.dumps([{'body': 'a'}, {'body': 'b'}]))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['message'],
+                         'at most 1 posts per request')
+
+    def test_multi_get(self):
+        r = Role.query.filter_by(name="User").first()
+        u1 = User(username="ayoub", email='ay@ex.com',
+                  password="ayoub2022", confirmed=True, role=r)
+        u2 = User(username="morad", email='ma@ex.com',
+                  password="morad2022", confirmed=True, role=r)
+        posts = [Post(body=f'post {i}', author=u1) for i in range(3)]
+        db.session.add_all([u1, u2] + posts)
+        db.session.commit()
+        db.session.add(Comment(body='comment', post=posts[0], author=u2))
+        db.session.commit()
+        headers = self.get_api_headers('ay@ex.com', 'ayoub2022')
+        ids = [posts[2].id, 999, posts[0].id]
+
+        before = len(get_debug_queries())
+        response = self.client.get(
+            '/api/v1/posts/?ids=' + ','.join(map(str, ids)), headers=headers)
+        self.assertEqual(response.status_code, 200)
+        queries = [q.statement for q in get_debug_queries()[before:]
+                   if 'FROM posts' in q.statement]
+        self.assertEqual(len(queries), 1)
+        data = response.get_json()
+        self.assertEqual([p['body'] for p in data['posts']],
+                         ['post 2', 'post 0'])
+        self.assertEqual(data['posts'][1]['comment_count'], 1)
+        self.assertEqual(data['missing'], [999])
+
+        response = self.client.get(
+            f'/api/v1/users/?ids={u2.id},{u1.id}', headers=headers)
+        data = response.get_json()
+        self.assertEqual([u['username'] for u in data['users']],
+                         ['morad', 'ayoub'])
+        self.assertEqual(data['users'][1]['post_count'], 3)
+
+        response = self.client.get('/api/v1/comments/?ids=1,2',
+                                   headers=headers)
+        data = response.get_json()
+        self.assertEqual(len(data['comments']), 1)
+        self.assertEqual(data['missing'], [2])
+
+        response = self.client.get('/api/v1/users/?ids=1,x', headers=headers)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/v1/users/', headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_fields_and_expand(self):
+        r = Role.query.filter_by(name="User").first()
+        u = User(username="ayoub", email='ay@ex.com',
+                 password="ayoub2022", confirmed=True, role=r)
+        posts = [Post(body=f'post {i}', author=u) for i in range(3)]
+        db.session.add_all([u] + posts)
+        db.session.commit()
+        headers = self.get_api_headers('ay@ex.com', 'ayoub2022')
+
+        response = self.client.get(
+            f'/api/v1/posts/{posts[0].id}?fields=id,body', headers=headers)
+        self.assertEqual(response.get_json(),
+                         {'id': posts[0].id, 'body': 'post 0'})
+        plain_etag = self.client.get(
+            f'/api/v1/posts/{posts[0].id}', headers=headers).headers['ETag']
+        self.assertNotEqual(response.headers['ETag'], plain_etag)
+
+        response = self.client.get(
+            '/api/v1/posts/?fields=body,author.username&expand=author',
+            headers=headers)
+        data = response.get_json()
+        self.assertEqual(data['posts'][0],
+                         {'body': 'post 2', 'author': {'username': 'ayoub'}})
+        self.assertIn('next', data)
+
+        before = len(get_debug_queries())
+        response = self.client.get('/api/v1/posts/?ids=1,2,3&expand=author',
+                                   headers=headers)
+        queries = [q.statement for q in get_debug_queries()[before:]
+                   if 'FROM users' in q.statement
+                   and 'WHERE users.email' not in q.statement]
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.get_json()['posts'][2]['author']['url'],
+                         f'/api/v1/users/{u.id}')
+
+        response = self.client.get(f'/api/v1/users/{u.id}?expand=author',
+                                   headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_export(self):
+        admin = Role.query.filter_by(name="Administrator").first()
+        user = Role.query.filter_by(name="User").first()
+        u1 = User(username="ayoub", email='ay@ex.com',
+                  password="ayoub2022", confirmed=True, role=admin)
+        u2 = User(username="morad", email='ma@ex.com',
+                  password="morad2022", confirmed=True, role=user)
+        db.session.add_all([u1, u2] + [Post(body=f'post {i}', author=u2)
+                                       for i in range(5)])
+        db.session.commit()
+        self.app.config['FLASKY_EXPORT_CHUNK_SIZE'] = 2
+
+        response = self.client.get(
+            '/api/v1/export/posts', headers=self.get_api_headers('ma@ex.com', 'morad2022'))
+        self.assertEqual(response.status_code, 403)
+
+        headers = self.get_api_headers('ay@ex.com', 'ayoub2022')
+        response = self.client.get('/api/v1/export/posts?fields=id,body',
+                                   headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual([json.loads(line) for line in lines],
+                         [{'id': i + 1, 'body': f'post {i}'}
+                          for i in range(5)])
+
+        response = self.client.get(
+            '/api/v1/export/users',
+            headers=dict(headers, **{'Accept-Encoding': 'gzip'}))
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(response.get_data()).splitlines()
+        self.assertEqual([json.loads(line)['username'] for line in lines],
+                         ['ayoub', 'morad'])
+
+        response = self.client.get(
+            '/api/v1/export/users',
+            headers=dict(headers, **{'Accept-Encoding': 'gzip;q=0'}))
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(len(response.get_data().splitlines()), 2)
+
+        response = self.client.get('/api/v1/export/roles', headers=headers)
+        self.assertEqual(response.status_code, 404)
+
+        # exporting leaves the objects of the request session attached
+        with self.app.test_request_context():
+            lines = b''.join(export_lines(Post)).splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertIn(u1, db.session)
+
+    def test_change_feed(self):
+        r = Role.query.filter_by(name="User").first()
+        u = User(username="ayoub", email='ay@ex.com',
+                 password="ayoub2022", confirmed=True, role=r)
+        posts = [Post(body=f'post {i}', author=u) for i in range(3)]
+        db.session.add_all([u] + posts)
+        db.session.commit()
+        comment = Comment(body='comment', post=posts[0], author=u)
+        db.session.add(comment)
+        db.session.commit()
+        headers = self.get_api_headers('ay@ex.com', 'ayoub2022')
+        self.app.config['FLASKY_CHANGES_PER_PAGE'] = 3
+
+        # the initial sync walks every change in bounded batches
+        response = self.client.get('/api/v1/posts/changes?fields=body',
+                                   headers=headers)
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertTrue(data['has_more'])
+        self.assertEqual([(c['type'], c['operation'], c['item'])
+                          for c in data['changes']],
+                         [('post', 'created', {'body': f'post {i}'})
+                          for i in range(3)])
+        response = self.client.get(data['next'], headers=headers)
+        data = response.get_json()
+        self.assertFalse(data['has_more'])
+        self.assertEqual([(c['type'], c['id'], c['disabled'])
+                          for c in data['changes']],
+                         [('comment', comment.id, False)])
+        self.assertEqual(data['changes'][0]['item'], {'body': 'comment'})
+        since = data['since']
+
+        # later requests only see what changed since the cursor
+        posts[1].body = 'edited'
+        comment.disabled = True
+        db.session.delete(posts[2])
+        db.session.commit()
+        before = len(get_debug_queries())
+        response = self.client.get(
+            f'/api/v1/posts/changes?since={since}', headers=headers)
+        queries = [q.statement for q in get_debug_queries()[before:]]
+        self.assertEqual(len([q for q in queries if 'FROM changes' in q]), 1)
+        changes = response.get_json()['changes']
+        self.assertEqual(
+            sorted((c['type'], c['operation']) for c in changes),
+            [('comment', 'moderated'), ('post', 'deleted'),
+             ('post', 'updated')])
+        for change in changes:
+            if change['operation'] == 'updated':
+                self.assertEqual(change['item']['body'], 'edited')
+            elif change['operation'] == 'deleted':
+                self.assertIsNone(change['item'])
+            else:
+                self.assertTrue(change['disabled'])
+        self.assertEqual(response.get_json()['since'],
+                         changes[-1]['sequence'])
+
+        response = self.client.get('/api/v1/posts/changes?since=x',
+                                   headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_change_sequence_and_compaction(self):
+        r = Role.query.filter_by(name="User").first()
+        u = User(username="ayoub", email='ay@ex.com',
+                 password="ayoub2022", confirmed=True, role=r)
+        post = Post(body='one', author=u)
+        db.session.add_all([u, post])
+        db.session.commit()
+
+        # a rolled back change does not leave a gap in the sequence
+        db.session.add(Post(body='rolled back', author=u))
+        db.session.flush()
+        self.assertEqual(Change.query.filter_by(sequence=None).count(), 1)
+        db.session.rollback()
+        for body in ('two', 'three'):
+            post.body = body
+            db.session.commit()
+        self.assertEqual([change.sequence for change in
+                          Change.query.order_by(Change.sequence)], [1, 2, 3])
+
+        self.assertEqual(Change.compact(), 2)
+        headers = self.get_api_headers('ay@ex.com', 'ayoub2022')
+        for since in (0, 1):
+            response = self.client.get(
+                f'/api/v1/posts/changes?since={since}', headers=headers)
+            changes = response.get_json()['changes']
+            self.assertEqual([(c['sequence'], c['operation'])
+                              for c in changes], [(3, 'updated')])
+            self.assertEqual(changes[0]['item']['body'], 'three')
+
+    def test_token_invalidation_waits_for_commit(self):
+        from app.api.tokens import generations
+        r = Role.query.filter_by(name="User").first()
+        u = User(username="ayoub", email='ay@ex.com',
+                 password="ayoub2022", confirmed=True, role=r)
+        db.session.add(u)
+        db.session.commit()
+        generation = generations[u.id]
+        u.confirmed = False
+        db.session.flush()
+        self.assertEqual(generations[u.id], generation)
+        db.session.rollback()
+        self.assertEqual(generations[u.id], generation)
+        u.confirmed = False
+        db.session.commit()
+        self.assertEqual(generations[u.id], generation + 1)
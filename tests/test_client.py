@@ -1,7 +1,8 @@
 import unittest
 import re
+from flask_sqlalchemy import get_debug_queries
 from app import create_app, db
-from app.models import Role, User
+from app.models import Comment, Post, Role, User
 
 
 class FlaskClientTestCase(unittest.TestCase):
@@ -72,3 +73,35 @@ class FlaskClientTestCase(unittest.TestCase):
         response = self.client.get("/auth/logout",  follow_redirects=True)
         self.assertEqual(response.status_code, 200)
         self.assertTrue('You have been logged out.' in response.get_data(as_text=True))
+
+    def test_list_pages_query_count(self):
+        self.app.config['FLASKY_POSTS_PER_PAGE'] = 5
+        self.app.config['FLASKY_COMMENTS_PER_PAGE'] = 5
+        users = [User(username=f'user{i}', email=f'user{i}@ex.com',
+                      password='password', confirmed=True) for i in range(5)]
+        db.session.add_all(users)
+        db.session.commit()
+        post = Post(body='first', author=users[0])
+        db.session.add(post)
+        for i in range(5):
+            db.session.add(Post(body=f'post {i}', author=users[0]))
+            db.session.add(Comment(body=f'comment {i}',
+                                   author=users[0], post=post))
+        db.session.commit()
+
+        def count_queries(url):
+            before = len(get_debug_queries())
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            return len(get_debug_queries()) - before
+
+        index_queries = count_queries('/')
+        post_queries = count_queries(f'/post/{post.id}')
+        for i in range(20):
+            db.session.add(Post(body=f'post {i}', author=users[i % 5]))
+            db.session.add(Comment(body=f'comment {i}',
+                                   author=users[i % 5], post=post))
+        db.session.commit()
+        self.assertEqual(count_queries('/'), index_queries)
+        self.assertEqual(count_queries(f'/post/{post.id}?page=2'),
+                         post_queries)
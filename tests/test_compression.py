@@ -0,0 +1,99 @@
+import gzip
+import json
+import os
+import unittest
+from base64 import b64encode
+from app import compress, create_app, db
+from app.models import Role, User
+
+
+class CompressionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.client = self.app.test_client()
+        r = Role.query.filter_by(name='User').first()
+        db.session.add(User(username='john', email='john@example.com',
+                            password='cat', confirmed=True, role=r))
+        db.session.commit()
+        self.headers = {
+            'Authorization': 'Basic ' + b64encode(
+                b'john@example.com:cat').decode('utf-8'),
+            'Accept': 'application/json',
+            'Content-Type': 'application/json'}
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def create_post(self, body):
+        response = self.client.post('/api/v1/posts/', headers=self.headers,
+                                    data=json.dumps({'body': body}))
+        self.assertEqual(response.status_code, 201)
+        return response.headers['Location']
+
+    def test_gzip_json(self):
+        url = self.create_post('compress me ' * 200)
+        headers = dict(self.headers, **{'Accept-Encoding': 'gzip'})
+        response = self.client.get(url, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.vary)
+        etag = response.headers['ETag']
+        self.assertTrue(etag.endswith('-gzip"'))
+        data = json.loads(gzip.decompress(response.get_data()))
+        self.assertEqual(data['body'], 'compress me ' * 200)
+
+        # the compressed body is cached by the ETag of the response
+        hits = compress.cache.hits
+        response = self.client.get(url, headers=headers)
+        self.assertEqual(response.headers['ETag'], etag)
+        self.assertEqual(compress.cache.hits, hits + 1)
+
+        # the suffixed tag validates in both directions
+        response = self.client.get(
+            url, headers=dict(headers, **{'If-None-Match': etag}))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+        self.assertIn('Accept-Encoding', response.vary)
+        base = etag[:-len('-gzip"')] + '"'
+        response = self.client.get(
+            url, headers=dict(self.headers, **{'If-None-Match': base}))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], base)
+        response = self.client.put(
+            url, headers=dict(self.headers, **{'If-Match': etag}),
+            data=json.dumps({'body': 'updated'}))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.put(
+            url, headers=dict(self.headers, **{'If-Match': etag}),
+            data=json.dumps({'body': 'stale'}))
+        self.assertEqual(response.status_code, 412)
+
+    def test_identity(self):
+        url = self.create_post('compress me ' * 200)
+        response = self.client.get(url, headers=self.headers)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertFalse(response.headers['ETag'].endswith('-gzip"'))
+
+        # small bodies are sent as they are
+        url = self.create_post('short')
+        response = self.client.get(
+            url, headers=dict(self.headers, **{'Accept-Encoding': 'gzip'}))
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.get_json()['body'], 'short')
+
+    def test_static(self):
+        path = os.path.join(self.app.static_folder, 'styles.css')
+        with open(path, 'rb') as f:
+            css = f.read()
+        self.assertIn('styles.css', compress.static)
+        response = self.client.get('/static/styles.css',
+                                   headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.get_data()), css)
+        response.close()
@@ -0,0 +1,64 @@
+import unittest
+from app import create_app, db
+from app.models import Comment, Post, Role, User
+
+
+class CountersTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.u1 = User(username='ayoub', email='ay@ex.com', password='ayoub2022')
+        self.u2 = User(username='morad', email='ma@ex.com', password='morad2022')
+        db.session.add_all([self.u1, self.u2])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_post_and_comment_counters(self):
+        post = Post(body='counted', author=self.u1)
+        db.session.add(post)
+        db.session.commit()
+        db.session.add_all([Comment(body='one', post=post, author=self.u2),
+                            Comment(body='two', post=post, author=self.u2)])
+        db.session.commit()
+        self.assertEqual(self.u1.post_count, 1)
+        self.assertEqual(post.comment_count, 2)
+        self.assertEqual(self.u2.comment_count, 2)
+
+        db.session.delete(post.comments.first())
+        db.session.commit()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(self.u2.comment_count, 1)
+
+    def test_follow_counters(self):
+        self.u1.follow(self.u2)
+        db.session.commit()
+        self.assertEqual(self.u1.followed_count, 1)
+        self.assertEqual(self.u2.follower_count, 1)
+        self.u1.unfollow(self.u2)
+        db.session.commit()
+        self.assertEqual(self.u1.followed_count, 0)
+        self.assertEqual(self.u2.follower_count, 0)
+
+    def test_recount_repairs_drift(self):
+        post = Post(body='counted', author=self.u1)
+        db.session.add_all([post, Comment(body='one', post=post, author=self.u2)])
+        self.u2.follow(self.u1)
+        db.session.commit()
+        db.session.execute(User.__table__.update().values(
+            post_count=7, comment_count=7, follower_count=7, followed_count=7))
+        db.session.execute(Post.__table__.update().values(comment_count=7))
+        db.session.commit()
+        User.recount()
+        Post.recount()
+        self.assertEqual(self.u1.post_count, 1)
+        self.assertEqual(self.u1.follower_count, 1)
+        self.assertEqual(self.u2.followed_count, 1)
+        self.assertEqual(self.u2.comment_count, 1)
+        self.assertEqual(post.comment_count, 1)
@@ -0,0 +1,77 @@
+import unittest
+from flask_sqlalchemy import get_debug_queries
+from app import create_app, db
+from app.counts import count, count_cache, table_estimate
+from app.models import Post, Role, RowCount, User
+
+
+class CountStrategyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        count_cache.clear()
+        self.user = User(username='ayoub', email='ay@ex.com', password='ayoub2022')
+        db.session.add(self.user)
+        db.session.add_all([Post(body=str(i), author=self.user) for i in range(3)])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def count(self, strategy, estimate=None):
+        self.app.config['FLASKY_COUNT_STRATEGIES'] = {'api.get_posts': strategy}
+        return count(Post.query, estimate=estimate, endpoint='api.get_posts')
+
+    def test_exact(self):
+        self.assertEqual(self.count('exact'), 3)
+
+    def test_cached_count_is_reused_and_invalidated(self):
+        self.assertEqual(self.count('cached'), 3)
+        before = len(get_debug_queries())
+        self.assertEqual(self.count('cached'), 3)
+        self.assertEqual(len(get_debug_queries()), before)
+        db.session.add(Post(body='new', author=self.user))
+        db.session.commit()
+        self.assertEqual(self.count('cached'), 4)
+
+    def test_estimated_uses_maintained_row_counter(self):
+        self.assertEqual(self.count('estimated', table_estimate('posts')), 3)
+        self.assertEqual(RowCount.query.get('posts').count, 3)
+        db.session.add(Post(body='new', author=self.user))
+        db.session.commit()
+        self.assertEqual(RowCount.query.get('posts').count, 4)
+        self.assertEqual(self.count('estimated', table_estimate('posts')), 4)
+
+    def test_counter_initialization_leaves_the_session_alone(self):
+        db.session.add(Post(body='pending', author=self.user))
+        self.assertEqual(RowCount.get('comments'), 0)
+        db.session.rollback()
+        self.assertEqual(Post.query.count(), 3)
+        self.assertEqual(RowCount.query.get('comments').count, 0)
+
+    def test_recount_repairs_drifted_counters(self):
+        RowCount.get('posts')
+        RowCount.get('comments')
+        db.session.execute(RowCount.__table__.update().values(count=7))
+        db.session.commit()
+        RowCount.recount()
+        self.assertEqual(RowCount.query.get('posts').count, 3)
+        self.assertEqual(RowCount.query.get('comments').count, 0)
+
+    def test_cached_count_waits_for_commit(self):
+        self.assertEqual(self.count('cached'), 3)
+        db.session.add(Post(body='rolled back', author=self.user))
+        db.session.flush()
+        db.session.rollback()
+        before = len(get_debug_queries())
+        self.assertEqual(self.count('cached'), 3)
+        self.assertEqual(len(get_debug_queries()), before)
+
+    def test_estimated_uses_counter_hint(self):
+        self.assertEqual(
+            self.count('estimated', lambda: self.user.post_count), 3)
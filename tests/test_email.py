@@ -0,0 +1,116 @@
+import datetime
+import socket
+import unittest
+from flask import current_app
+from app import create_app, db
+from app.email import deliver_pending, send_email
+from app.models import OutboxMessage, Role, User
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    Controller = None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.envelopes = []
+        self.peers = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.envelopes.append(envelope)
+        self.peers.add(session.peer)
+        return '250 OK'
+
+
+class EmailTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.user = User(username='ayoub', email='ay@ex.com',
+                         password='ayoub2022')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def use_smtp(self, port):
+        state = current_app.extensions['mail']
+        state.server = '127.0.0.1'
+        state.port = port
+        state.use_tls = state.use_ssl = False
+        state.username = state.password = None
+        state.suppress = False
+
+    def queue(self, count):
+        with self.app.test_request_context():
+            for i in range(count):
+                send_email(f'user{i}@ex.com', 'Confirm Your Account',
+                           'mail/confirm', user=self.user, token='token')
+            db.session.commit()
+
+    def test_send_email_is_queued(self):
+        with self.app.extensions['mail'].record_messages() as outbox:
+            self.queue(1)
+        self.assertEqual(outbox, [])
+        message = OutboxMessage.query.one()
+        self.assertEqual(message.recipient, 'user0@ex.com')
+        self.assertTrue(message.subject.endswith('Confirm Your Account'))
+        self.assertIn('token', message.body)
+
+    def test_send_email_joins_the_caller_transaction(self):
+        with self.app.test_request_context():
+            self.user.username = 'pending'
+            send_email('ay@ex.com', 'Confirm Your Account', 'mail/confirm',
+                       user=self.user, token='token')
+            db.session.rollback()
+        self.assertEqual(OutboxMessage.query.count(), 0)
+        self.assertEqual(User.query.one().username, 'ayoub')
+
+    @unittest.skipUnless(Controller, 'aiosmtpd is not installed')
+    def test_batch_uses_one_connection(self):
+        handler = RecordingHandler()
+        port = free_port()
+        controller = Controller(handler, hostname='127.0.0.1', port=port)
+        controller.start()
+        self.addCleanup(controller.stop)
+        self.use_smtp(port)
+
+        self.queue(3)
+        self.assertEqual(deliver_pending(), 3)
+        self.assertEqual(deliver_pending(), 0)
+        self.assertEqual(OutboxMessage.query.count(), 0)
+        self.assertEqual(sorted(e.rcpt_tos[0] for e in handler.envelopes),
+                         ['user0@ex.com', 'user1@ex.com', 'user2@ex.com'])
+        self.assertEqual(len(handler.peers), 1)
+
+    def test_retry_with_backoff(self):
+        self.use_smtp(free_port())
+        self.app.config['FLASKY_MAIL_MAX_ATTEMPTS'] = 2
+        self.queue(1)
+
+        self.assertEqual(deliver_pending(), 1)
+        message = OutboxMessage.query.one()
+        self.assertEqual(message.attempts, 1)
+        self.assertIsNotNone(message.last_error)
+        self.assertGreater(message.next_attempt, datetime.datetime.utcnow())
+        self.assertEqual(deliver_pending(), 0)
+
+        message.next_attempt = datetime.datetime.utcnow()
+        db.session.commit()
+        self.assertEqual(deliver_pending(), 1)
+        message = OutboxMessage.query.one()
+        self.assertEqual(message.attempts, 2)
+        self.assertIsNone(message.next_attempt)
@@ -0,0 +1,63 @@
+import unittest
+from app import create_app, db
+from app.main.fragments import fragment_cache
+from app.models import Comment, Post, Role, User
+
+
+class FragmentCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        fragment_cache.clear()
+        self.client = self.app.test_client(use_cookies=True)
+        moderator = Role.query.filter_by(name='Moderator').first()
+        self.user = User(username='ayoub', email='ay@ex.com',
+                         password='ayoub2022', confirmed=True, role=moderator)
+        self.post = Post(body='original body', author=self.user)
+        self.comment = Comment(body='rude comment', author=self.user,
+                               post=self.post)
+        db.session.add_all([self.user, self.post, self.comment])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def login(self):
+        self.client.post('/auth/login', data={
+            'email': 'ay@ex.com', 'password': 'ayoub2022'})
+
+    def test_edit_bumps_version(self):
+        self.assertIn('original body', self.client.get('/').get_data(as_text=True))
+        self.login()
+        self.client.post(f'/edit/{self.post.id}', data={'body': 'edited body'})
+        self.assertEqual(self.post.version, 2)
+        data = self.client.get('/').get_data(as_text=True)
+        self.assertIn('edited body', data)
+        self.assertNotIn('original body', data)
+
+    def test_viewer_dependent_markup_is_not_cached(self):
+        data = self.client.get('/').get_data(as_text=True)
+        self.assertNotIn('<span class="label label-primary">Edit</span>', data)
+        self.login()
+        data = self.client.get('/').get_data(as_text=True)
+        self.assertIn('<span class="label label-primary">Edit</span>', data)
+
+    def test_moderation_toggles_bump_version(self):
+        self.login()
+        post_url = f'/post/{self.post.id}'
+        self.assertIn('rude comment', self.client.get(post_url).get_data(as_text=True))
+        self.client.get(f'/moderate/disable/{self.comment.id}')
+        data = self.client.get(post_url).get_data(as_text=True)
+        self.assertNotIn('rude comment', data)
+        self.assertIn('disabled by a moderator', data)
+        data = self.client.get('/moderate').get_data(as_text=True)
+        self.assertIn('rude comment', data)
+        self.assertIn('Enable</a>', data)
+        self.client.get(f'/moderate/enable/{self.comment.id}')
+        data = self.client.get(post_url).get_data(as_text=True)
+        self.assertNotIn('disabled by a moderator', data)
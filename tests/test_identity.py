@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+from flask_sqlalchemy import get_debug_queries
+from app import create_app, db, identity
+from app.models import Permission, Role, User
+
+
+class IdentityTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        u = User(username='ayoub', email='ay@ex.com', password='ayoub2022')
+        db.session.add(u)
+        db.session.commit()
+        self.user_id = u.id
+        db.session.remove()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def queries(self, before):
+        return get_debug_queries()[before:]
+
+    def test_permission_checks_are_cached(self):
+        user = identity.get_user(self.user_id)
+        self.assertTrue(user.can(Permission.WRITE))
+        db.session.remove()
+
+        before = len(get_debug_queries())
+        user = identity.get_user(self.user_id)
+        self.assertEqual(user.username, 'ayoub')
+        self.assertTrue(user.can(Permission.WRITE))
+        self.assertFalse(user.can(Permission.MODERATE))
+        self.assertFalse(user.is_administrator())
+        self.assertEqual(self.queries(before), [])
+
+        before = len(get_debug_queries())
+        User(username='morad', email='ma@ex.com', password='morad2022')
+        self.assertEqual(self.queries(before), [])
+
+    def test_changes_invalidate(self):
+        user = identity.get_user(self.user_id)
+        user.role = Role.query.filter_by(name='Moderator').first()
+        db.session.commit()
+        db.session.remove()
+        self.assertTrue(identity.get_user(self.user_id).can(
+            Permission.MODERATE))
+
+        role = Role.query.filter_by(name='Moderator').first()
+        role.remove_permission(Permission.MODERATE)
+        db.session.commit()
+        db.session.remove()
+        self.assertFalse(identity.get_user(self.user_id).can(
+            Permission.MODERATE))
+
+    def test_version_stamp(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        self.app.config['FLASKY_IDENTITY_STAMP'] = path
+        identity.get_user(self.user_id).can(Permission.WRITE)
+        db.session.remove()
+
+        # another worker changes a role behind this one's back
+
+        db.session.execute(Role.__table__.update().values(permissions=0))
+        db.session.commit()
+        db.session.remove()
+        self.assertTrue(identity.get_user(self.user_id).can(Permission.WRITE))
+        os.utime(path, ns=(0, 0))
+        self.assertFalse(identity.get_user(self.user_id).can(
+            Permission.WRITE))
+
+    def test_invalidation_waits_for_commit(self):
+        moderator = Role.query.filter_by(name='Moderator').first()
+        user = identity.get_user(self.user_id)
+        user.role = moderator
+        self.assertTrue(user.can(Permission.MODERATE))
+        db.session.flush()
+        self.assertIn(self.user_id, identity.users._items)
+        db.session.rollback()
+        db.session.remove()
+        self.assertFalse(identity.get_user(self.user_id).can(
+            Permission.MODERATE))
+
+        user = identity.get_user(self.user_id)
+        user.role = Role.query.filter_by(name='Moderator').first()
+        db.session.commit()
+        self.assertNotIn(self.user_id, identity.users._items)
+
+    def test_unwritable_stamp(self):
+        self.app.config['FLASKY_IDENTITY_STAMP'] = os.path.join(
+            tempfile.gettempdir(), 'missing', 'dir', 'stamp')
+        user = identity.get_user(self.user_id)
+        user.username = 'renamed'
+        db.session.commit()
+        db.session.remove()
+        self.assertEqual(identity.get_user(self.user_id).username, 'renamed')
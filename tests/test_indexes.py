@@ -0,0 +1,30 @@
+import unittest
+from app import create_app, db
+from app.explain import hot_queries, is_sequential_scan, query_plan
+
+
+class IndexesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_is_sequential_scan(self):
+        self.assertTrue(is_sequential_scan('SCAN follows'))
+        self.assertTrue(is_sequential_scan('Seq Scan on follows'))
+        self.assertFalse(is_sequential_scan(
+            'SCAN posts USING INDEX ix_posts_timestamp'))
+        self.assertFalse(is_sequential_scan(
+            'Index Scan on posts'))
+
+    def test_hot_queries_use_indexes(self):
+        for endpoint, query in hot_queries():
+            for step in query_plan(query):
+                self.assertFalse(is_sequential_scan(step),
+                                 f'{endpoint}: {step}')
@@ -0,0 +1,76 @@
+import unittest
+from flask_sqlalchemy import get_debug_queries
+from app import create_app, db
+from app.main.page_cache import page_cache
+from app.models import Post, Role, User
+
+
+class PageCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['FLASKY_PAGE_CACHE_TTL'] = {'main.index': 30,
+                                                   'main.user': 60}
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        page_cache.clear()
+        self.client = self.app.test_client(use_cookies=True)
+        self.user = User(username='ayoub', email='ay@ex.com',
+                         password='ayoub2022', confirmed=True)
+        db.session.add_all([self.user, Post(body='first post', author=self.user)])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_anonymous_pages_are_cached(self):
+        response = self.client.get('/')
+        self.assertIn('public', response.headers['Cache-Control'])
+        self.assertIn('max-age=30', response.headers['Cache-Control'])
+        self.assertIn('Cookie', response.headers['Vary'])
+        before = len(get_debug_queries())
+        cached = self.client.get('/')
+        self.assertEqual(len(get_debug_queries()), before)
+        self.assertEqual(cached.get_data(), response.get_data())
+
+    def test_new_posts_invalidate(self):
+        self.client.get(f'/user/{self.user.username}')
+        db.session.add(Post(body='second post', author=self.user))
+        db.session.commit()
+        data = self.client.get(f'/user/{self.user.username}').get_data(as_text=True)
+        self.assertIn('second post', data)
+
+    def test_invalidation_waits_for_commit(self):
+        self.client.get('/')
+        db.session.add(Post(body='rolled back', author=self.user))
+        db.session.flush()
+        db.session.rollback()
+        before = len(get_debug_queries())
+        self.client.get('/')
+        self.assertEqual(len(get_debug_queries()), before)
+
+    def test_profile_changes_invalidate(self):
+        url = f'/user/{self.user.username}'
+        self.client.get(url)
+        self.user.about_me = 'Writes about caches.'
+        db.session.commit()
+        data = self.client.get(url).get_data(as_text=True)
+        self.assertIn('Writes about caches.', data)
+
+    def test_authenticated_users_bypass(self):
+        self.client.get('/')
+        self.client.post('/auth/login', data={
+            'email': 'ay@ex.com', 'password': 'ayoub2022'})
+        response = self.client.get('/')
+        self.assertIn('private', response.headers['Cache-Control'])
+        self.assertIn('Hello, ayoub', response.get_data(as_text=True))
+
+    def test_flashed_messages_bypass(self):
+        self.client.get('/')
+        with self.client.session_transaction() as session:
+            session['_flashes'] = [('message', 'Flashed for you.')]
+        response = self.client.get('/')
+        self.assertIn('Flashed for you.', response.get_data(as_text=True))
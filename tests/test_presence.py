@@ -0,0 +1,59 @@
+import datetime
+import unittest
+from flask_sqlalchemy import get_debug_queries
+from app import create_app, db
+from app.models import Role, User
+from app.presence import last_seen_buffer
+
+
+class PresenceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.u1 = User(username='ayoub', email='ay@ex.com', password='ayoub2022')
+        self.u2 = User(username='morad', email='ma@ex.com', password='morad2022')
+        db.session.add_all([self.u1, self.u2])
+        db.session.commit()
+        last_seen_buffer.recent.clear()
+
+    def tearDown(self):
+        last_seen_buffer.pending.clear()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def last_seen(self, user):
+        return db.session.scalar(db.select(User.last_seen).where(
+            User.id == user.id))
+
+    def updates(self, before):
+        return [q for q in get_debug_queries()[before:]
+                if q.statement.startswith('UPDATE users')]
+
+    def test_ping_resolution(self):
+        before = len(get_debug_queries())
+        self.u1.ping()
+        seen = self.u1.last_seen
+        self.assertEqual(self.last_seen(self.u1), seen)
+        self.u1.ping()
+        self.assertEqual(self.u1.last_seen, seen)
+        self.assertEqual(len(self.updates(before)), 1)
+
+    def test_pings_are_flushed_together(self):
+        self.app.config['FLASKY_LAST_SEEN_FLUSH_INTERVAL'] = 3600
+        old = self.last_seen(self.u1)
+        self.u1.ping()
+        self.u2.ping()
+        self.assertEqual(self.last_seen(self.u1), old)
+        self.assertEqual(len(last_seen_buffer.pending), 2)
+
+        last_seen_buffer._timer.cancel()
+        last_seen_buffer._timer = None
+        before = len(get_debug_queries())
+        self.assertEqual(last_seen_buffer.flush(), 2)
+        self.assertEqual(len(self.updates(before)), 1)
+        self.assertNotEqual(self.last_seen(self.u1), old)
+        self.assertIsInstance(self.last_seen(self.u2), datetime.datetime)
@@ -0,0 +1,113 @@
+import os
+import tempfile
+import unittest
+from base64 import b64encode
+from flask_sqlalchemy import get_debug_queries
+from app import create_app, db
+from app.api import ratelimit
+from app.models import Role, User
+
+
+class RateLimitTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['FLASKY_RATE_LIMITS'] = {
+            'default': {'user': (2, 60), 'ip': (4, 60)},
+        }
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        u = User(username='ayoub', email='ay@ex.com',
+                 password='ayoub2022', confirmed=True)
+        db.session.add(u)
+        db.session.commit()
+        ratelimit.backends.clear()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        ratelimit.backends.clear()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def get_api_headers(self, email, password):
+        return {
+            'Authorization': 'Basic ' + b64encode(
+                (email + ':' + password).encode('utf-8')).decode('utf-8'),
+            'Accept': 'application/json',
+            'Content-Type': 'application/json'
+        }
+
+    def test_limits_and_headers(self):
+        headers = self.get_api_headers('ay@ex.com', 'ayoub2022')
+        response = self.client.get('/api/v1/posts/', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['RateLimit-Limit'], '2')
+        self.assertEqual(response.headers['RateLimit-Remaining'], '1')
+        response = self.client.get('/api/v1/posts/', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['RateLimit-Remaining'], '0')
+
+        # over the user limit: rejected without spending an ip token
+
+        response = self.client.get('/api/v1/posts/', headers=headers)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.get_json()['error'], 'too many requests')
+        self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+        self.assertGreater(ratelimit.quota['default', 'limited'], 0)
+
+        # failed logins are charged to the ip; once it is empty, requests
+        # are rejected before authentication touches the db
+
+        for i in range(2):
+            response = self.client.get(
+                '/api/v1/posts/',
+                headers=self.get_api_headers('ma@ex.com', 'x'))
+            self.assertEqual(response.status_code, 401)
+        before = len(get_debug_queries())
+        response = self.client.get(
+            '/api/v1/posts/', headers=self.get_api_headers('ma@ex.com', 'x'))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(get_debug_queries()[before:], [])
+
+    def test_wrong_passwords_do_not_spend_user_quota(self):
+        self.app.config['FLASKY_RATE_LIMITS']['default']['ip'] = (10, 60)
+        for i in range(4):
+            response = self.client.get(
+                '/api/v1/posts/',
+                headers=self.get_api_headers('ay@ex.com', 'wrong'))
+            self.assertEqual(response.status_code, 401)
+        response = self.client.get(
+            '/api/v1/posts/',
+            headers=self.get_api_headers('ay@ex.com', 'ayoub2022'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['RateLimit-Remaining'], '1')
+
+    def test_endpoint_limits(self):
+        self.app.config['FLASKY_RATE_LIMITS']['api.get_posts'] = {
+            'ip': (1, 60)}
+        headers = self.get_api_headers('ay@ex.com', 'ayoub2022')
+        response = self.client.get('/api/v1/posts/', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/v1/posts/', headers=headers)
+        self.assertEqual(response.status_code, 429)
+        response = self.client.get('/api/v1/comments/', headers=headers)
+        self.assertEqual(response.status_code, 200)
+
+    def test_shared_backend(self):
+        fd, path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        first = ratelimit.SQLiteBackend(path)
+        second = ratelimit.SQLiteBackend(path)
+        ip = ('ip:default:a', 2, 1 / 60)
+        user = ('user:default:1', 1, 1 / 120)
+        self.assertEqual(first.take([ip], 100.0), (True, [1]))
+        self.assertEqual(second.take([ip, user], 100.0), (True, [0, 0]))
+        self.assertFalse(first.take([ip], 100.0)[0])
+        self.assertEqual(second.peek(*ip, 100.0), 0)
+
+        # a bucket that denies leaves the others untouched
+        self.assertEqual(first.take([ip, user], 160.0), (False, [1, 0.5]))
+        self.assertEqual(second.take([ip], 160.0), (True, [0]))
@@ -0,0 +1,71 @@
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+from app import create_app, db
+from app.models import Comment, Post, Role, User
+from app.rendering import render_cache, render_many, rendered_bodies
+
+
+class RenderingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        render_cache.clear()
+        render_cache.hits = render_cache.misses = 0
+        render_cache.persisted_hits = 0
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_repeated_bodies_hit_the_cache(self):
+        p1 = Post(body='*quoted*')
+        p2 = Post(body='*quoted*')
+        self.assertEqual(p1.body_html, '<p><em>quoted</em></p>')
+        self.assertEqual(p2.body_html, p1.body_html)
+        self.assertEqual(render_cache.misses, 1)
+        self.assertEqual(render_cache.hits, 1)
+
+    def test_tag_whitelist_is_part_of_the_key(self):
+        post = Post(body='# title')
+        comment = Comment(body='# title')
+        self.assertEqual(post.body_html, '<h1>title</h1>')
+        self.assertEqual(comment.body_html, 'title')
+        self.assertEqual(render_cache.misses, 2)
+
+    def test_persisted_cache(self):
+        self.app.config['FLASKY_RENDER_CACHE_PERSIST'] = True
+        db.session.add(Post(body='**persisted**'))
+        db.session.commit()
+        self.assertEqual(db.session.query(rendered_bodies).count(), 1)
+        render_cache.clear()
+        post = Post(body='**persisted**')
+        self.assertEqual(post.body_html, '<p><strong>persisted</strong></p>')
+        self.assertEqual(render_cache.persisted_hits, 1)
+
+    def test_render_many_in_process_pool(self):
+        self.app.config['FLASKY_RENDER_POOL_WORKERS'] = 2
+        self.app.config['FLASKY_RENDER_POOL_BATCH'] = 2
+        bodies = [f'*body {i}*' for i in range(4)] + ['*body 0*']
+        html = render_many(bodies, Post.allowed_tags)
+        self.assertEqual(html[0], '<p><em>body 0</em></p>')
+        self.assertEqual(html[3], '<p><em>body 3</em></p>')
+        self.assertEqual(html[4], html[0])
+        self.assertEqual(render_cache.misses, 4)
+        self.assertEqual(Post(body='*body 2*').body_html,
+                         '<p><em>body 2</em></p>')
+        self.assertEqual(render_cache.hits, 1)
+
+    def test_large_body_falls_back_when_pool_is_broken(self):
+        self.app.config['FLASKY_RENDER_POOL_WORKERS'] = 2
+        self.app.config['FLASKY_RENDER_POOL_THRESHOLD'] = 10
+        with mock.patch('app.rendering.get_pool') as get_pool:
+            get_pool.return_value.map.side_effect = BrokenProcessPool()
+            self.assertEqual(Post(body='*a long enough body*').body_html,
+                             '<p><em>a long enough body</em></p>')
+            get_pool.return_value.map.assert_called_once()
+            get_pool.return_value.shutdown.assert_called_once_with(wait=False)
@@ -0,0 +1,148 @@
+import json
+import os
+import tempfile
+import unittest
+from base64 import b64encode
+from flask import g
+from app import create_app, db
+from app.api.response_cache import SQLiteBackend, backends, depends_on, \
+    get_backend, version_key
+from app.cache import caches
+from app.models import Comment, Post, Role, User
+from app.presence import last_seen_buffer
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.client = self.app.test_client()
+        r = Role.query.filter_by(name='User').first()
+        self.user = User(username='john', email='john@example.com',
+                         password='cat', confirmed=True, role=r)
+        self.post = Post(body='cached', author=self.user)
+        db.session.add_all([self.user, self.post])
+        db.session.commit()
+        self.headers = {
+            'Authorization': 'Basic ' + b64encode(
+                b'john@example.com:cat').decode('utf-8'),
+            'Accept': 'application/json',
+            'Content-Type': 'application/json'}
+
+    def tearDown(self):
+        last_seen_buffer.pending.clear()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def get(self, url):
+        response = self.client.get(url, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_read_through(self):
+        backend = get_backend()
+        url = f'/api/v1/posts/{self.post.id}'
+        hits, misses = backend.hits, backend.misses
+        json_post = self.get(url)
+        self.assertEqual(backend.misses, misses + 1)
+        self.assertEqual(self.get(url), json_post)
+        self.assertEqual(backend.hits, hits + 1)
+
+        # writes through the API and the ORM bump the version
+        stale = backend.stale
+        response = self.client.put(url, headers=self.headers,
+                                   data=json.dumps({'body': 'edited'}))
+        self.assertEqual(response.status_code, 200)
+        json_post = self.get(url)
+        self.assertEqual(json_post['body'], 'edited')
+        self.assertEqual(backend.stale, stale + 1)
+        db.session.add(Comment(body='first', post=self.post,
+                               author=self.user))
+        db.session.commit()
+        json_post = self.get(url)
+        self.assertEqual(json_post['comment_count'], 1)
+
+        # uncommitted changes do not invalidate anything
+        self.post.body = 'rolled back'
+        db.session.flush()
+        db.session.rollback()
+        stale = backend.stale
+        self.assertEqual(self.get(url), json_post)
+        self.assertEqual(backend.stale, stale)
+
+    def test_dependencies(self):
+        url = f'/api/v1/posts/{self.post.id}?expand=author'
+        json_post = self.get(url)
+        self.assertEqual(json_post['author']['username'], 'john')
+        self.user.username = 'johnny'
+        db.session.commit()
+        json_post = self.get(url)
+        self.assertEqual(json_post['author']['username'], 'johnny')
+
+        url = f'/api/v1/users/{self.user.id}/posts/'
+        json_posts = self.get(url)
+        self.assertEqual(json_posts['count'], 1)
+        db.session.add(Post(body='second', author=self.user))
+        db.session.commit()
+        json_posts = self.get(url)
+        self.assertEqual(json_posts['count'], 2)
+        self.assertEqual(json_posts['posts'][0]['body'], 'second')
+
+    def test_dependency_versions_are_read_before_serializing(self):
+        backend = get_backend()
+        key = version_key(Post, self.post.id)
+        with self.app.test_request_context():
+            g.response_dependencies = {}
+            depends_on(self.post)
+            version = g.response_dependencies[key]
+            # a change committed while the response is being built
+            backend.bump([key])
+            depends_on(self.post)
+            self.assertEqual(g.response_dependencies[key], version)
+        self.assertNotEqual(backend.current([key]), [version])
+
+    def test_bulk_updates(self):
+        url = f'/api/v1/users/{self.user.id}'
+        json_user = self.get(url)
+        last_seen_buffer.pending[self.user.id] = \
+            self.user.last_seen.replace(year=2030)
+        last_seen_buffer.flush()
+        json_user = self.get(url)
+        self.assertIn('2030', json_user['last_seen'])
+
+    def test_sqlite_backend(self):
+        memory = get_backend()
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            self.app.config['FLASKY_RESPONSE_CACHE_STORAGE'] = \
+                'sqlite:///' + path
+            backend = get_backend()
+            self.assertIsInstance(backend, SQLiteBackend)
+            url = '/api/v1/comments/'
+            self.get(f'/api/v1/users/{self.user.id}')
+            self.get(f'/api/v1/users/{self.user.id}')
+            self.assertEqual(backend.stats()['hits'], 1)
+            self.assertEqual(backend.current(['users:1', 'users:2']), [0, 0])
+            backend.bump(['users:1'])
+            self.assertEqual(backend.current(['users:1', 'users:2']), [1, 0])
+
+            backend.maxsize = 2
+            for i in range(4):
+                backend.set(url + str(i), i, ttl=60 + i)
+            self.assertEqual(len(backend), 2)
+            self.assertIsNone(backend.get(url + '0'))
+            self.assertEqual(backend.get(url + '3'), 3)
+            self.assertGreaterEqual(backend.stats()['evictions'], 2)
+            backend.clear()
+        finally:
+            backends.pop('sqlite:///' + path).connection().close()
+            caches['responses'] = memory
+            os.remove(path)
+            for suffix in ('-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
@@ -0,0 +1,60 @@
+import datetime
+import json
+import unittest
+from flask import url_for
+from flask.json.provider import DefaultJSONProvider
+from app import create_app, urls
+from app.serialization import FastJSONProvider, json_page_timings, \
+    sample_posts
+
+
+class SerializationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_url_templates(self):
+        endpoints = ['api.get_user', 'api.get_user_posts',
+                     'api.get_user_followed_posts', 'api.get_post',
+                     'api.get_post_comments', 'api.get_comment']
+        with self.app.test_request_context(base_url='http://x/prefix'):
+            for endpoint in endpoints:
+                self.assertEqual(urls.build(endpoint, id=42),
+                                 url_for(endpoint, id=42))
+            self.assertEqual(urls.build('api.get_posts', page=2),
+                             url_for('api.get_posts', page=2))
+            self.assertTrue(urls.build('api.get_post', id=1)
+                            .startswith('/prefix/api/v1/'))
+
+        app = create_app('testing')
+        app.config['FLASKY_URL_TEMPLATES'] = False
+        with app.test_request_context():
+            self.assertEqual(urls.build('api.get_comment', id=7),
+                             url_for('api.get_comment', id=7))
+        self.assertNotIn('url_templates', app.extensions)
+
+    def test_provider_matches_default(self):
+        self.assertIsInstance(self.app.json, FastJSONProvider)
+        value = {'b': [1, 2.5, None, True], 'a': 'café "quoted"',
+                 'when': datetime.datetime(2022, 10, 18, 12, 30),
+                 'day': datetime.date(2022, 10, 18)}
+        default = DefaultJSONProvider(self.app)
+        self.assertEqual(json.loads(self.app.json.dumps(value)),
+                         json.loads(default.dumps(value)))
+        self.assertIn('"when":"Tue, 18 Oct 2022 12:30:00 GMT"',
+                      self.app.json.dumps(value))
+        self.assertEqual(self.app.json.dumps({1: 'x'}), '{"1":"x"}')
+
+    def test_benchmark(self):
+        with self.app.test_request_context():
+            posts = sample_posts(2)
+            self.assertEqual(posts[1].to_json()['url'], '/api/v1/posts/2')
+        timings = list(json_page_timings('testing', sizes=(20,), rounds=1))
+        self.assertEqual([path for size, path, ms in timings],
+                         ['json + url_for', 'json + url templates',
+                          'fast provider + url templates'])
+        self.assertTrue(self.app.config['FLASKY_URL_TEMPLATES'])
@@ -0,0 +1,85 @@
+import unittest
+from app import create_app, db
+from app.models import Post, Role, User, Timeline
+
+
+class TimelineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.u1 = User(username='ayoub', email='ay@ex.com', password='ayoub2022')
+        self.u2 = User(username='morad', email='ma@ex.com', password='morad2022')
+        db.session.add_all([self.u1, self.u2])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_fan_out_on_post(self):
+        self.u2.follow(self.u1)
+        db.session.commit()
+        post = Post(body='fan out', author=self.u1)
+        db.session.add(post)
+        db.session.commit()
+        self.assertEqual(self.u2.timeline.all(), [post])
+        self.assertEqual(self.u1.timeline.count(), 0)
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        posts = [Post(body=str(i), author=self.u1) for i in range(3)]
+        db.session.add_all(posts)
+        db.session.commit()
+        self.u2.follow(self.u1)
+        db.session.commit()
+        self.assertEqual(self.u2.timeline.count(), 3)
+        self.u2.unfollow(self.u1)
+        db.session.commit()
+        self.assertEqual(self.u2.timeline.count(), 0)
+
+    def test_timeline_is_bounded(self):
+        self.app.config['FLASKY_TIMELINE_LENGTH'] = 2
+        self.u2.follow(self.u1)
+        db.session.commit()
+        posts = []
+        for i in range(4):
+            post = Post(body=str(i), author=self.u1)
+            db.session.add(post)
+            db.session.commit()
+            posts.append(post)
+        self.assertEqual(self.u2.timeline.count(), 4)
+        self.assertEqual(Timeline.trim_all(), 1)
+        timeline = self.u2.timeline.order_by(Timeline.timestamp.desc()).all()
+        self.assertEqual(timeline, posts[:-3:-1])
+
+        # following trims the backfilled timeline right away
+        u3 = User(username='sara', email='sa@ex.com', password='sara2022')
+        u3.follow(self.u1)
+        db.session.add(u3)
+        db.session.commit()
+        self.assertEqual(u3.timeline.count(), 2)
+
+    def test_delete_post(self):
+        self.u2.follow(self.u1)
+        post = Post(body='deleted', author=self.u1)
+        db.session.add(post)
+        db.session.commit()
+        db.session.execute(db.text('PRAGMA foreign_keys=ON'))
+        try:
+            db.session.delete(post)
+            db.session.commit()
+        finally:
+            db.session.execute(db.text('PRAGMA foreign_keys=OFF'))
+        self.assertEqual(self.u2.timeline.count(), 0)
+
+    def test_rebuild(self):
+        self.u2.follow(self.u1)
+        db.session.add(Post(body='rebuilt', author=self.u1))
+        db.session.commit()
+        Timeline.query.delete()
+        db.session.commit()
+        Timeline.rebuild()
+        self.assertEqual(self.u2.timeline.count(), 1)